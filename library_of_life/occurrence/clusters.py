@@ -0,0 +1,138 @@
+import threading
+from typing import Optional, Iterable, Dict, List, Set
+
+from .search import DEFAULT_MAX_WORKERS
+from .single_occurrence import SingleOccurrence
+from ..utils.concurrency import bounded_map
+
+
+class RelatedOccurrenceCrawler:
+    """
+    Groups occurrences into clusters of related records, e.g. duplicate specimens held in several collections, by crawling get_related_occurrences_by_id outwards from seed IDs.
+
+    The crawl is breadth-first. Each level of the frontier is expanded concurrently, occurrences already visited are never expanded again, and relations fetched once are cached for later crawls. Relations are treated as undirected, so the clusters returned are the connected components of the crawled graph.
+
+    Attributes:
+        single: The SingleOccurrence client used for requests.
+        max_depth: Number of relation hops followed from a seed.
+        max_workers: Number of requests issued at once.
+        max_nodes: Optional. The most occurrences visited, seeds included. Once reached, no further occurrences are added, though relations among visited ones are still recorded.
+    """
+
+    def __init__(
+        self,
+        single: Optional[SingleOccurrence] = None,
+        max_depth: int = 3,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_nodes: Optional[int] = None,
+    ):
+        self.single = single or SingleOccurrence()
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self.max_nodes = max_nodes
+        self.errors: Dict[str, dict] = {}
+        self._cache: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def related(self, gbif_id) -> List[str]:
+        """
+        Returns the IDs of the occurrences directly related to one occurrence, from the cache when it was fetched before.
+
+        Args:
+            gbif_id (int): The gbifId of the occurrence.
+
+        Returns:
+            list: The gbifIds of related occurrences, as strings. Empty when the request failed; the error is kept in errors.
+        """
+        gbif_id = str(gbif_id)
+        with self._lock:
+            if gbif_id in self._cache:
+                return self._cache[gbif_id]
+        response = self.single.get_related_occurrences_by_id(gbif_id)
+        if not isinstance(response, dict) or "error" in response or "Error" in response:
+            with self._lock:
+                self.errors[gbif_id] = response
+            return []
+        related = []
+        for relation in response.get("relatedOccurrences", []):
+            occurrence = relation.get("occurrence", {})
+            key = occurrence.get("gbifId", occurrence.get("key"))
+            if key is not None and str(key) != gbif_id:
+                related.append(str(key))
+        with self._lock:
+            self._cache[gbif_id] = related
+        return related
+
+    def crawl(self, seeds: Iterable) -> Dict[str, Set[str]]:
+        """
+        Crawls the relation graph breadth-first from seed IDs, up to max_depth hops.
+
+        Args:
+            seeds (iterable): The gbifIds to start from.
+
+        Returns:
+            dict: Every visited gbifId mapped to the set of gbifIds it is related to, in both directions.
+        """
+        graph: Dict[str, Set[str]] = {}
+        frontier = []
+        for seed in seeds:
+            seed = str(seed)
+            if seed not in graph:
+                graph[seed] = set()
+                frontier.append(seed)
+
+        for _ in range(self.max_depth):
+            if not frontier:
+                break
+            next_frontier = []
+            for gbif_id, related in bounded_map(
+                self.related, frontier, max_workers=self.max_workers
+            ):
+                for other in related:
+                    if other not in graph:
+                        if self.max_nodes is not None and len(graph) >= self.max_nodes:
+                            # Relations to occurrences beyond the cap are left out.
+                            continue
+                        graph[other] = set()
+                        next_frontier.append(other)
+                    graph[gbif_id].add(other)
+                    graph[other].add(gbif_id)
+            frontier = next_frontier
+        return graph
+
+    def clusters(self, seeds: Iterable) -> List[List[str]]:
+        """
+        Returns the clusters of related occurrences reachable from seed IDs.
+
+        Args:
+            seeds (iterable): The gbifIds to start from.
+
+        Returns:
+            list: The connected components of the crawled graph, each a sorted list of gbifIds, largest first. Seeds without relations form clusters of one.
+        """
+        graph = self.crawl(seeds)
+        parent = {node: node for node in graph}
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for node, neighbours in graph.items():
+            for other in neighbours:
+                root, other_root = find(node), find(other)
+                if root != other_root:
+                    parent[other_root] = root
+
+        components: Dict[str, List[str]] = {}
+        for node in graph:
+            components.setdefault(find(node), []).append(node)
+        return sorted(
+            (sorted(component, key=_id_sort_key) for component in components.values()),
+            key=lambda component: (-len(component), _id_sort_key(component[0])),
+        )
+
+
+def _id_sort_key(gbif_id):
+    return (len(gbif_id), gbif_id)
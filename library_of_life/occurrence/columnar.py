@@ -0,0 +1,345 @@
+import os
+import struct
+import tempfile
+import zipfile
+from typing import Optional, List, Dict, Any
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pq = None
+
+try:
+    import fastavro
+except ImportError:
+    fastavro = None
+
+# Size of the fixed part of a zip local file header.
+_LOCAL_HEADER_SIZE = 30
+
+
+class ParquetDownloadReader:
+    """
+    Reads a SIMPLE_PARQUET occurrence download without loading it into memory. Requires pyarrow.
+
+    The download is a zip holding the part files of a Parquet dataset. Parts stored without compression in the zip, as the Parquet parts normally are, are read in place from a memory map of the zip file, so nothing is extracted or copied. Deflated parts are extracted once to extract_dir.
+
+    Only the requested columns are read. Filters skip whole row groups whose column statistics rule them out, and the remaining rows are then filtered exactly.
+
+    Filters are given as a dictionary of column names, matched ignoring case and underscores (so taxon_key matches taxonkey), to a single value, a list of values, or a (lower, upper) tuple for an inclusive range with None as an open bound, e.g. {"year": (2000, 2010), "countrycode": ["DE", "FR"], "taxonkey": 212}.
+
+    Attributes:
+        path: The zip file, or a directory or single file of extracted Parquet parts.
+        memory_map: Whether files are read through memory maps.
+        extract_dir: Where deflated parts are extracted to.
+    """
+
+    def __init__(self, path, memory_map: bool = True, extract_dir=None):
+        if pa is None:
+            raise ImportError(
+                "ParquetDownloadReader requires pyarrow. Install it with `pip install pyarrow`."
+            )
+        self.path = path
+        self.memory_map = memory_map
+        self.extract_dir = extract_dir
+        self._parts = self._open_parts()
+        self.schema = self._parts[0].schema_arrow if self._parts else pa.schema([])
+
+    def iter_batches(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        batch_size: int = 65536,
+    ):
+        """
+        Streams the matching rows as Arrow record batches.
+
+        Args:
+            columns (list): Optional. The columns to read. Default is every column.
+            filters (dict): Optional. Conditions every returned row meets, as described on the class.
+            batch_size (int): Optional. The maximum number of rows per batch. Default is 65536.
+
+        Yields:
+            pyarrow.RecordBatch: A batch with the requested columns.
+        """
+        conditions = [
+            (self._column(name), condition) for name, condition in (filters or {}).items()
+        ]
+        names = None if columns is None else [self._column(name) for name in columns]
+        needed = None
+        if names is not None:
+            needed = names + [name for name, _ in conditions if name not in names]
+
+        for part in self._parts:
+            for row_group in range(part.num_row_groups):
+                if not _row_group_may_match(part, row_group, conditions):
+                    continue
+                for batch in part.iter_batches(
+                    batch_size=batch_size, row_groups=[row_group], columns=needed
+                ):
+                    if conditions:
+                        mask = _mask(batch, conditions)
+                        batch = batch.filter(mask)
+                        if batch.num_rows == 0:
+                            continue
+                    if names is not None and needed != names:
+                        batch = batch.select(names)
+                    yield batch
+
+    def read(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Reads the matching rows into one table.
+
+        Args:
+            columns (list): Optional. The columns to read. Default is every column.
+            filters (dict): Optional. Conditions every returned row meets, as described on the class.
+
+        Returns:
+            pyarrow.Table: The matching rows.
+        """
+        batches = list(self.iter_batches(columns, filters))
+        if batches:
+            return pa.Table.from_batches(batches)
+        schema = self.schema
+        if columns is not None:
+            schema = pa.schema([schema.field(self._column(name)) for name in columns])
+        return schema.empty_table()
+
+    def _column(self, name):
+        key = name.replace("_", "").casefold()
+        for field in self.schema.names:
+            if field.replace("_", "").casefold() == key:
+                return field
+        raise KeyError(f"The download has no column {name}.")
+
+    def _open_parts(self):
+        if os.path.isdir(self.path):
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(self.path)
+                for name in names
+                if not name.startswith((".", "_"))
+            )
+            return [pq.ParquetFile(f, memory_map=self.memory_map) for f in files]
+        if not zipfile.is_zipfile(self.path):
+            return [pq.ParquetFile(self.path, memory_map=self.memory_map)]
+
+        parts = []
+        mapped = pa.memory_map(self.path) if self.memory_map else None
+        with zipfile.ZipFile(self.path) as archive, open(self.path, "rb") as raw:
+            for info in sorted(archive.infolist(), key=lambda i: i.filename):
+                name = info.filename.rsplit("/", 1)[-1]
+                if info.is_dir() or not name or name.startswith((".", "_")):
+                    continue
+                if info.compress_type == zipfile.ZIP_STORED:
+                    raw.seek(info.header_offset)
+                    header = raw.read(_LOCAL_HEADER_SIZE)
+                    name_length, extra_length = struct.unpack("<HH", header[26:30])
+                    start = info.header_offset + _LOCAL_HEADER_SIZE + name_length + extra_length
+                    if self.memory_map:
+                        source = pa.BufferReader(mapped.read_at(info.file_size, start))
+                    else:
+                        source = pa.BufferReader(pa.py_buffer(_read_at(raw, start, info.file_size)))
+                    parts.append(pq.ParquetFile(source))
+                else:
+                    target = self.extract_dir or tempfile.mkdtemp(prefix="gbif_parquet_")
+                    self.extract_dir = target
+                    extracted = archive.extract(info, target)
+                    parts.append(pq.ParquetFile(extracted, memory_map=self.memory_map))
+        return parts
+
+
+class AvroDownloadReader:
+    """
+    Reads a SIMPLE_AVRO occurrence download block by block, straight from the zip file. Requires fastavro.
+
+    Only the requested columns are decoded: the file is read with a reader schema limited to those fields, so the others are skipped. Avro blocks carry no statistics, so filters are applied to each decoded block and only matching records are returned. Filters take the same form as for ParquetDownloadReader.
+
+    Attributes:
+        path: The zip file or the extracted .avro file.
+    """
+
+    def __init__(self, path):
+        if fastavro is None:
+            raise ImportError(
+                "AvroDownloadReader requires fastavro. Install it with `pip install fastavro`."
+            )
+        self.path = path
+        with self._open() as f:
+            self.schema = fastavro.reader(f).writer_schema
+
+    def field_names(self) -> List[str]:
+        """
+        Returns the names of the fields in the file.
+
+        Returns:
+            list: The field names.
+        """
+        return [field["name"] for field in self.schema["fields"]]
+
+    def iter_batches(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Streams the matching records, one Avro block at a time.
+
+        Args:
+            columns (list): Optional. The fields to read. Default is every field.
+            filters (dict): Optional. Conditions every returned record meets.
+
+        Yields:
+            list: The matching records of one block, as dictionaries.
+        """
+        conditions = [
+            (self._field(name), condition) for name, condition in (filters or {}).items()
+        ]
+        reader_schema = None
+        names = None
+        if columns is not None:
+            names = [self._field(name) for name in columns]
+            needed = names + [name for name, _ in conditions if name not in names]
+            reader_schema = dict(self.schema)
+            reader_schema["fields"] = [
+                field for field in self.schema["fields"] if field["name"] in needed
+            ]
+        with self._open() as f:
+            for block in fastavro.block_reader(f, reader_schema=reader_schema):
+                records = [
+                    record
+                    for record in block
+                    if all(_matches(record.get(name), condition) for name, condition in conditions)
+                ]
+                if names is not None and len(names) != len(reader_schema["fields"]):
+                    records = [{name: record[name] for name in names} for record in records]
+                if records:
+                    yield records
+
+    def iter_rows(
+        self,
+        columns: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Streams the matching records one at a time.
+
+        Args:
+            columns (list): Optional. The fields to read. Default is every field.
+            filters (dict): Optional. Conditions every returned record meets.
+
+        Yields:
+            dict: A single record.
+        """
+        for batch in self.iter_batches(columns, filters):
+            yield from batch
+
+    def _field(self, name):
+        key = name.replace("_", "").casefold()
+        for field in self.field_names():
+            if field.replace("_", "").casefold() == key:
+                return field
+        raise KeyError(f"The download has no field {name}.")
+
+    def _open(self):
+        if not zipfile.is_zipfile(self.path):
+            return open(self.path, "rb")
+        archive = zipfile.ZipFile(self.path)
+        members = [name for name in archive.namelist() if name.endswith(".avro")]
+        if not members:
+            archive.close()
+            raise ValueError(f"{self.path} contains no .avro file.")
+        return _MemberFile(archive, archive.open(members[0]))
+
+
+class _MemberFile:
+    # A zip member that closes its archive along with itself.
+    def __init__(self, archive, member):
+        self._archive = archive
+        self._member = member
+
+    def read(self, *args):
+        return self._member.read(*args)
+
+    def close(self):
+        self._member.close()
+        self._archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _read_at(f, start, size):
+    f.seek(start)
+    return f.read(size)
+
+
+def _matches(value, condition):
+    if value is None:
+        return False
+    if isinstance(condition, tuple):
+        lower, upper = condition
+        return (lower is None or value >= lower) and (upper is None or value <= upper)
+    if isinstance(condition, (list, set)):
+        return value in condition
+    return value == condition
+
+
+def _mask(batch, conditions):
+    mask = None
+    for name, condition in conditions:
+        column = batch.column(batch.schema.get_field_index(name))
+        if isinstance(condition, tuple):
+            lower, upper = condition
+            part = pc.is_valid(column)
+            if lower is not None:
+                part = pc.and_(part, pc.greater_equal(column, pa.scalar(lower, column.type)))
+            if upper is not None:
+                part = pc.and_(part, pc.less_equal(column, pa.scalar(upper, column.type)))
+        elif isinstance(condition, (list, set)):
+            part = pc.is_in(column, value_set=pa.array(list(condition), type=column.type))
+        else:
+            part = pc.equal(column, pa.scalar(condition, column.type))
+        part = pc.fill_null(part, False)
+        mask = part if mask is None else pc.and_(mask, part)
+    return mask
+
+
+def _row_group_may_match(part, row_group, conditions):
+    if not conditions:
+        return True
+    metadata = part.metadata.row_group(row_group)
+    chunks = {
+        metadata.column(i).path_in_schema: i for i in range(metadata.num_columns)
+    }
+    for name, condition in conditions:
+        if name not in chunks:
+            continue
+        statistics = metadata.column(chunks[name]).statistics
+        if statistics is None or not statistics.has_min_max:
+            continue
+        low, high = statistics.min, statistics.max
+        try:
+            if isinstance(condition, tuple):
+                lower, upper = condition
+                if (lower is not None and high < lower) or (upper is not None and low > upper):
+                    return False
+            elif isinstance(condition, (list, set)):
+                if not any(low <= value <= high for value in condition):
+                    return False
+            elif not low <= condition <= high:
+                return False
+        except TypeError:
+            continue
+    return True
@@ -0,0 +1,222 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+
+from .downloads import OccurrenceDownload
+from .predicates import canonical_dict
+from ..utils import http_client as hc
+
+# Statuses of downloads whose file is, or will be, available for reuse.
+REUSABLE_STATUSES = ("SUCCEEDED",)
+IN_PROGRESS_STATUSES = ("PREPARING", "RUNNING", "SUSPENDED")
+
+
+class DownloadIndex:
+    """
+    A local index of occurrence downloads by predicate, so that a download someone already made can be reused instead of waiting for GBIF to prepare the same data again.
+
+    Each download is filed under a hash of its canonical predicate and format, so predicates that differ only in member order, value order or key spelling share an entry. The index is filled from get_user_download_info and from downloads requested through request, and kept in a SQLite database.
+
+    Attributes:
+        username: The GBIF username whose downloads are indexed.
+        state_path: Path of the SQLite database.
+    """
+
+    def __init__(
+        self,
+        username,
+        password,
+        state_path="download_index.sqlite",
+        download: Optional[OccurrenceDownload] = None,
+    ):
+        self.username = username
+        self.password = password
+        self.state_path = state_path
+        self.download = download or OccurrenceDownload()
+        self._db = sqlite3.connect(state_path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS downloads (
+                    download_key TEXT PRIMARY KEY,
+                    predicate_hash TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    status TEXT,
+                    created TEXT,
+                    size INTEGER,
+                    predicate TEXT NOT NULL
+                )
+                """
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS downloads_predicate_hash ON downloads (predicate_hash)"
+            )
+
+    @staticmethod
+    def predicate_hash(predicate, download_format: str = "DWCA") -> str:
+        """
+        Returns the key under which downloads of a predicate are indexed.
+
+        Args:
+            predicate (Predicate or dict): The download predicate.
+            download_format (str): Optional. The download format. Default is DWCA.
+
+        Returns:
+            str: A hash of the canonical predicate and the format.
+        """
+        return hc.query_hash(
+            {"predicate": canonical_dict(predicate), "format": download_format.upper()}
+        )
+
+    def refresh(self, page_size: int = 100) -> int:
+        """
+        Adds or updates every download of the user listed by get_user_download_info.
+
+        Args:
+            page_size (int): Optional. Number of downloads requested per page. Default is 100.
+
+        Returns:
+            int: The number of downloads indexed. Downloads made with SQL instead of a predicate are skipped.
+        """
+        offset, indexed = 0, 0
+        while True:
+            page = self.download.get_user_download_info(
+                self.username,
+                self.username,
+                self.password,
+                statistics=False,
+                limit=page_size,
+                offset=offset,
+            )
+            if not isinstance(page, dict) or "error" in page:
+                raise RuntimeError(f"Could not list downloads: {page}")
+            for download in page.get("results", []):
+                request = download.get("request") or {}
+                if request.get("predicate") is None:
+                    continue
+                self._upsert(
+                    download["key"],
+                    request["predicate"],
+                    request.get("format", "DWCA"),
+                    status=download.get("status"),
+                    created=download.get("created"),
+                    size=download.get("size"),
+                )
+                indexed += 1
+            if page.get("endOfRecords", True) or not page.get("results"):
+                return indexed
+            offset += page_size
+
+    def find(
+        self,
+        predicate,
+        download_format: str = "DWCA",
+        max_age_days: Optional[int] = None,
+        include_in_progress: bool = False,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Returns the most recent indexed download of an equivalent predicate.
+
+        Args:
+            predicate (Predicate or dict): The download predicate.
+            download_format (str): Optional. The download format. Default is DWCA.
+            max_age_days (int): Optional. Ignore downloads created longer ago than this.
+            include_in_progress (bool): Optional. Also return downloads that are still being prepared. Default is False.
+
+        Returns:
+            dict: The download key, status, creation date, size and predicate, or None when there is no such download.
+        """
+        statuses = REUSABLE_STATUSES + (IN_PROGRESS_STATUSES if include_in_progress else ())
+        query = (
+            "SELECT * FROM downloads WHERE predicate_hash = ? AND status IN (%s)"
+            % ",".join("?" * len(statuses))
+        )
+        args = [self.predicate_hash(predicate, download_format), *statuses]
+        if max_age_days is not None:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+            query += " AND created >= ?"
+            args.append(cutoff.date().isoformat())
+        row = self._db.execute(query + " ORDER BY created DESC LIMIT 1", args).fetchone()
+        if row is None:
+            return None
+        found = dict(row)
+        found["predicate"] = json.loads(found["predicate"])
+        return found
+
+    def request(
+        self,
+        request_body: Dict[str, Any],
+        reuse: bool = True,
+        max_age_days: Optional[int] = 30,
+        include_in_progress: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Returns the key of a download for a request, reusing an equivalent download when there is one and requesting a new one otherwise. New downloads are added to the index.
+
+        Args:
+            request_body (dict): The JSON request body, as passed to request_download. Its predicate may be a Predicate.
+            reuse (bool): Optional. Look for an equivalent download first. Default is True.
+            max_age_days (int): Optional. Only reuse downloads created within this many days. Default is 30.
+            include_in_progress (bool): Optional. Also reuse downloads that are still being prepared. Default is True.
+
+        Returns:
+            dict: "download_key" and "reused", and "status" for reused downloads. The error returned by request_download when the request failed.
+        """
+        predicate = canonical_dict(request_body["predicate"])
+        download_format = request_body.get("format", "DWCA")
+        if reuse:
+            found = self.find(predicate, download_format, max_age_days, include_in_progress)
+            if found is not None:
+                return {
+                    "download_key": found["download_key"],
+                    "status": found["status"],
+                    "reused": True,
+                }
+        body = dict(request_body)
+        body["predicate"] = predicate
+        response = self.download.request_download(self.username, self.password, body)
+        if not isinstance(response, str) or not response:
+            return response
+        self._upsert(
+            response,
+            predicate,
+            download_format,
+            status="PREPARING",
+            created=datetime.now(timezone.utc).isoformat(),
+        )
+        return {"download_key": response, "reused": False}
+
+    def close(self):
+        """
+        Closes the index database.
+        """
+        self._db.close()
+
+    def _upsert(self, download_key, predicate, download_format, status=None, created=None, size=None):
+        with self._db:
+            self._db.execute(
+                """
+                INSERT INTO downloads VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (download_key) DO UPDATE SET
+                    status = excluded.status,
+                    created = COALESCE(excluded.created, downloads.created),
+                    size = COALESCE(excluded.size, downloads.size)
+                """,
+                (
+                    download_key,
+                    self.predicate_hash(predicate, download_format),
+                    download_format.upper(),
+                    status,
+                    created,
+                    size,
+                    json.dumps(canonical_dict(predicate)),
+                ),
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
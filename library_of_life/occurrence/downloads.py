@@ -72,22 +72,64 @@ class OccurrenceDownload:
                 base_url + self.endpoint + resource, headers=headers, json=request_body
             )
 
-    def retrieve_download(self, download_key):
+    def retrieve_download(
+        self,
+        download_key,
+        path: Optional[str] = None,
+        chunk_size: int = hc.DOWNLOAD_CHUNK_SIZE,
+        resume: bool = True,
+        connections: int = 1,
+    ):
         """
-        Retrieves the download file if it is available.
+        Retrieves the download file if it is available. The file is streamed to disk in chunks and only appears at path once complete; an interrupted retrieval is resumed from where it stopped.
+
+        With more than one connection, the file is split into byte ranges downloaded in parallel. Every range must come from a file of the size given in the download metadata, and when the metadata carries a checksum, which GBIF downloads usually do not, the file is checked against it before it is moved to path. This is faster for large archives when a single connection cannot use the available bandwidth.
 
         Args:
             download_key (str): An identifier for a download. Example : 0001005-130906152512535
+            path (str): Optional. Where to write the file. Default is {download_key}.zip in the current directory.
+            chunk_size (int): Optional. Number of bytes written at a time. Default is 1 MiB.
+            resume (bool): Optional. Continue a partial file left by an earlier attempt. Only applies to single-connection retrievals. Default is True.
+            connections (int): Optional. Number of parallel connections. Default is 1.
 
         Returns:
-            binary: A zip file of the downloaded data.
+            str: The path of the zip file, or a dictionary with error information.
         """
         resource = f"/request/{download_key}"
-        data = hc.get_for_content(base_url + self.endpoint + resource)
-        with open(f"{download_key}.zip", "wb") as f:
-            print(f"{download_key}.zip successfully downloaded")
-            f.write(data)
-        return f"{download_key}.zip"
+        path = path or f"{download_key}.zip"
+        info = (
+            self.get_occurrence_download_info_by_key(download_key)
+            if connections > 1
+            else {}
+        )
+        if info.get("size"):
+            checksum = next(
+                (
+                    (name, info[name])
+                    for name in ("sha256", "md5")
+                    if info.get(name)
+                ),
+                (None, None),
+            )
+            result = hc.download_ranges_to_file(
+                base_url + self.endpoint + resource,
+                path,
+                size=info["size"],
+                connections=connections,
+                expected_hash=checksum[1],
+                hash_name=checksum[0] or "md5",
+                chunk_size=chunk_size,
+            )
+        else:
+            result = hc.download_to_file(
+                base_url + self.endpoint + resource,
+                path,
+                chunk_size=chunk_size,
+                resume=resume,
+            )
+        if result == path:
+            print(f"{path} successfully downloaded")
+        return result
 
     # Requires authentication. User must have an account with GBIF.
     def cancel_running_download(self, username=None, password=None, download_key=None):
@@ -143,7 +185,7 @@ class OccurrenceDownload:
             response = hc.post_with_auth_and_json(
                 base_url + self.endpoint + resource, auth=auth, json=request_body
             )
-            if "404" in response["error"]:
+            if isinstance(response, dict) and "404" in str(response.get("error", "")):
                 return "Invalid query, see other documentation."
             else:
                 return response
@@ -153,7 +195,7 @@ class OccurrenceDownload:
             response = hc.post_with_auth_and_json(
                 base_url + self.endpoint + resource, headers=headers, json=request_body
             )
-            if "404" in response["error"]:
+            if isinstance(response, dict) and "404" in str(response.get("error", "")):
                 return "Invalid query, see other documentation."
             else:
                 return response
@@ -182,7 +224,7 @@ class OccurrenceDownload:
             ("verbatimExtensions", verbatim_extensions),
         ]
         hc.add_params(params, params_list)
-        resource = "request/predicate"
+        resource = "/request/predicate"
         return hc.get_with_params(base_url + self.endpoint + resource, params=params)
 
     def get_occurrence_download_info_by_key(
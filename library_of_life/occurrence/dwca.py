@@ -0,0 +1,192 @@
+import csv
+import io
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Optional, List, Dict
+
+from .download_formats import DownloadFormats
+from .schema import field_types, section_types, converter_for
+
+# Large free-text fields, e.g. dynamicProperties, exceed the csv module's default limit.
+_FIELD_SIZE_LIMIT = 1 << 24
+
+
+class DwcaReader:
+    """
+    Reads a Darwin Core Archive download straight from its zip file, without extracting it.
+
+    The archive descriptor, meta.xml, gives the files, their columns and their delimiters. Rows are decoded from the compressed members as they are read and returned in batches, so memory depends on the batch size and not on the size of the archive. Column types come from DownloadFormats.describe_dwca_fields, fetched once per process.
+
+    Attributes:
+        path: The path of the zip file.
+        batch_size: Number of rows per batch.
+        typed: Whether values are converted to the types of their fields.
+    """
+
+    def __init__(
+        self,
+        path,
+        batch_size: int = 10000,
+        typed: bool = True,
+        formats: Optional[DownloadFormats] = None,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.typed = typed
+        self.formats = formats
+        self._zip = zipfile.ZipFile(path)
+        self._tables = self._read_meta()
+
+    def files(self) -> List[str]:
+        """
+        Returns the data files of the archive, core file first.
+
+        Returns:
+            list: File names such as occurrence.txt and verbatim.txt.
+        """
+        return list(self._tables)
+
+    def columns(self, file: str = "occurrence.txt") -> List[str]:
+        """
+        Returns the column names of a data file: the local names of its terms, and "id" or "coreid" for the identifier column.
+
+        Args:
+            file (str): Optional. The data file. Default is occurrence.txt.
+
+        Returns:
+            list: The column names in file order.
+        """
+        return [name for name, _ in self._table(file)["columns"]]
+
+    def iter_batches(
+        self,
+        file: str = "occurrence.txt",
+        columns: Optional[List[str]] = None,
+        batch_size: Optional[int] = None,
+    ):
+        """
+        Streams the rows of a data file in batches.
+
+        Args:
+            file (str): Optional. The data file, e.g. occurrence.txt or verbatim.txt. Default is occurrence.txt.
+            columns (list): Optional. The columns to keep. Default is every column.
+            batch_size (int): Optional. Number of rows per batch. Default is the reader's batch_size.
+
+        Yields:
+            list: A batch of rows, each a dictionary of column names and values.
+        """
+        table = self._table(file)
+        names = [name for name, _ in table["columns"]]
+        wanted = names if columns is None else list(columns)
+        missing = [name for name in wanted if name not in names]
+        if missing:
+            raise KeyError(f"{file} has no columns {missing}.")
+        positions = [names.index(name) for name in wanted]
+
+        converters = [None] * len(wanted)
+        if self.typed:
+            types = section_types(field_types("dwca", self.formats), file)
+            terms = dict(table["columns"])
+            converters = [
+                converter_for(types.get(terms[name]) or types.get(name))
+                for name in wanted
+            ]
+        columns_out = list(zip(wanted, positions, converters))
+        batch_size = batch_size or self.batch_size
+
+        csv.field_size_limit(max(csv.field_size_limit(), _FIELD_SIZE_LIMIT))
+        with self._zip.open(table["location"]) as raw:
+            text = io.TextIOWrapper(raw, encoding=table["encoding"], newline="")
+            reader = csv.reader(text, **table["dialect"])
+            for _ in range(table["header_lines"]):
+                next(reader, None)
+            batch = []
+            for row in reader:
+                if not row:
+                    continue
+                record = {}
+                for name, position, converter in columns_out:
+                    value = row[position] if position < len(row) else ""
+                    if value == "":
+                        record[name] = None
+                    elif converter is None:
+                        record[name] = value
+                    else:
+                        record[name] = converter(value)
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    def iter_rows(self, file: str = "occurrence.txt", columns: Optional[List[str]] = None):
+        """
+        Streams the rows of a data file one at a time.
+
+        Args:
+            file (str): Optional. The data file. Default is occurrence.txt.
+            columns (list): Optional. The columns to keep. Default is every column.
+
+        Yields:
+            dict: A single row.
+        """
+        for batch in self.iter_batches(file, columns):
+            yield from batch
+
+    def close(self):
+        """
+        Closes the zip file.
+        """
+        self._zip.close()
+
+    def _table(self, file):
+        for location, table in self._tables.items():
+            if location == file or location.rsplit("/", 1)[-1] == file:
+                return table
+        raise KeyError(f"The archive has no data file {file}.")
+
+    def _read_meta(self):
+        root = ET.fromstring(self._zip.read("meta.xml"))
+        tables: Dict[str, dict] = {}
+        for element in root:
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag not in ("core", "extension"):
+                continue
+            location = element.find("./{*}files/{*}location").text.strip()
+            columns: Dict[int, tuple] = {}
+            for child in element:
+                child_tag = child.tag.rsplit("}", 1)[-1]
+                if child_tag in ("id", "coreid"):
+                    columns.setdefault(int(child.get("index")), (child_tag, child_tag))
+                elif child_tag == "field" and child.get("index") is not None:
+                    term = child.get("term")
+                    name = term.rstrip("/").rsplit("/", 1)[-1]
+                    columns[int(child.get("index"))] = (name, term)
+            width = max(columns) + 1 if columns else 0
+            enclosed = _unescape(element.get("fieldsEnclosedBy", ""))
+            tables[location] = {
+                "location": location,
+                "columns": [
+                    columns.get(index, (f"column{index}", f"column{index}"))
+                    for index in range(width)
+                ],
+                "encoding": element.get("encoding", "UTF-8"),
+                "header_lines": int(element.get("ignoreHeaderLines", "0")),
+                "dialect": {
+                    "delimiter": _unescape(element.get("fieldsTerminatedBy", "\\t")),
+                    "quotechar": enclosed or None,
+                    "quoting": csv.QUOTE_MINIMAL if enclosed else csv.QUOTE_NONE,
+                },
+            }
+        return tables
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _unescape(value):
+    return value.replace("\\t", "\t").replace("\\n", "\n").replace("\\r", "\r")
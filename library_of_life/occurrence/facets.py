@@ -0,0 +1,270 @@
+import itertools
+import re
+from typing import Optional, List, Dict, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .search import OccurrenceSearch, DEFAULT_MAX_WORKERS
+from ..utils.concurrency import bounded_map
+
+# Facets whose search_occurrences keyword is not the snake_case form of the facet name.
+FACET_PARAMS = {
+    "gadmLevel0Gid": "gadm_level_0_gid",
+    "gadmLevel1Gid": "gadm_level_1_gid",
+    "gadmLevel2Gid": "gadm_level_2_gid",
+    "gadmLevel3Gid": "gadm_level_3_gid",
+    "publishingOrg": "publising_org",
+}
+
+
+class FacetAggregator:
+    """
+    Collects occurrence facet counts with concurrent, automatically paged facet requests.
+
+    Attributes:
+        search: The OccurrenceSearch client used for requests.
+        facet_page_size: Number of facet values requested per page.
+        max_workers: Number of requests issued at once.
+    """
+
+    def __init__(
+        self,
+        search: Optional[OccurrenceSearch] = None,
+        facet_page_size: int = 1000,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        self.search = search or OccurrenceSearch()
+        self.facet_page_size = facet_page_size
+        self.max_workers = max_workers
+
+    def facet_counts(self, facet: str, **search_params) -> Dict[str, int]:
+        """
+        Returns every value of a facet with its count, paging through facet_offset until all values are collected.
+
+        Args:
+            facet (str): The facet name, e.g. "basisOfRecord" or "basis_of_record".
+            **search_params: Optional. Any filter accepted by search_occurrences.
+
+        Returns:
+            dict: Facet values mapped to their counts.
+        """
+        counts: Dict[str, int] = {}
+        offset = 0
+        while True:
+            page = self.search.search_occurrences(
+                limit=0,
+                facet=_to_camel(facet),
+                facet_limit=self.facet_page_size,
+                facet_offset=offset,
+                **search_params,
+            )
+            if "error" in page:
+                raise RuntimeError(f"Facet request failed: {page['error']}")
+            values = [
+                value
+                for result in page.get("facets", [])
+                for value in result.get("counts", [])
+            ]
+            for value in values:
+                counts[str(value["name"])] = value["count"]
+            if len(values) < self.facet_page_size:
+                return counts
+            offset += self.facet_page_size
+
+    def multi_facet_counts(self, facets: List[str], **search_params) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the counts of several facets, fetched concurrently.
+
+        Args:
+            facets (list): The facet names.
+            **search_params: Optional. Any filter accepted by search_occurrences.
+
+        Returns:
+            dict: Each facet name mapped to its value counts.
+        """
+        return dict(
+            bounded_map(
+                lambda facet: self.facet_counts(facet, **search_params),
+                facets,
+                max_workers=self.max_workers,
+            )
+        )
+
+    def facet_cube(
+        self,
+        facets: List[str],
+        max_requests: int = 10000,
+        **search_params,
+    ) -> "FacetCube":
+        """
+        Builds a cube of counts across several facets, e.g. year x country x basisOfRecord. Requires numpy.
+
+        The values of every facet are collected first. Then, for each combination of values of all but the last facet, the last facet is counted with the other facets used as filters. These requests run concurrently and are merged into one array, so the result can be sliced without further calls.
+
+        Args:
+            facets (list): The facet names, one per axis.
+            max_requests (int): Optional. Refuse to build cubes needing more requests than this.
+            **search_params: Optional. Any filter accepted by search_occurrences.
+
+        Returns:
+            FacetCube: The counts with labelled axes.
+        """
+        if np is None:
+            raise ImportError(
+                "facet_cube requires numpy. Install it with `pip install numpy`."
+            )
+        if not facets:
+            raise ValueError("At least one facet is required.")
+        marginals = self.multi_facet_counts(facets, **search_params)
+        labels = [sorted(marginals[facet]) for facet in facets]
+        counts = np.zeros([len(axis) for axis in labels], dtype=np.int64)
+        if len(facets) == 1:
+            for i, label in enumerate(labels[0]):
+                counts[i] = marginals[facets[0]][label]
+            return FacetCube(facets, labels, counts)
+
+        leading = list(itertools.product(*labels[:-1]))
+        if len(leading) > max_requests:
+            raise ValueError(
+                f"The cube needs {len(leading)} requests, more than max_requests={max_requests}."
+            )
+        last_index = {label: i for i, label in enumerate(labels[-1])}
+        indexes = [{label: i for i, label in enumerate(axis)} for axis in labels[:-1]]
+
+        def count_cell(combination):
+            filters = dict(search_params)
+            for facet, value in zip(facets[:-1], combination):
+                filters[_search_param(facet)] = [value]
+            return self.facet_counts(facets[-1], **filters)
+
+        for combination, cell_counts in bounded_map(
+            count_cell, leading, max_workers=self.max_workers
+        ):
+            position = tuple(index[value] for index, value in zip(indexes, combination))
+            for label, count in cell_counts.items():
+                if label in last_index:
+                    counts[position + (last_index[label],)] = count
+        return FacetCube(facets, labels, counts)
+
+
+class FacetCube:
+    """
+    Occurrence counts across several facets, held in a NumPy array with one labelled axis per facet.
+
+    Attributes:
+        axes: The facet name of each axis.
+        labels: The facet values along each axis.
+        counts: The array of counts.
+    """
+
+    def __init__(self, axes: List[str], labels: List[List[str]], counts):
+        self.axes = list(axes)
+        self.labels = [list(axis) for axis in labels]
+        self.counts = counts
+        self._index = [{label: i for i, label in enumerate(axis)} for axis in self.labels]
+
+    def sel(self, **selection) -> Any:
+        """
+        Selects part of the cube by facet value, e.g. cube.sel(year="2020", country=["DE", "FR"]). A single value drops its axis; a list keeps it.
+
+        Args:
+            **selection: Facet names mapped to a value or a list of values.
+
+        Returns:
+            FacetCube: The selected part, or an int when every axis is fixed to a single value.
+        """
+        axes, labels, index = [], [], []
+        for position, axis in enumerate(self.axes):
+            key = _lookup(selection, axis)
+            if key is None:
+                axes.append(axis)
+                labels.append(self.labels[position])
+                index.append(slice(None))
+            elif isinstance(key, (list, tuple)):
+                axes.append(axis)
+                labels.append([str(k) for k in key])
+                index.append([self._index[position][str(k)] for k in key])
+            else:
+                index.append(self._index[position][str(key)])
+        counts = self.counts[np.ix_(*[_as_indexer(i, n) for i, n in zip(index, self.counts.shape)])]
+        counts = counts.reshape([len(axis) for axis in labels])
+        if not axes:
+            return int(counts)
+        return FacetCube(axes, labels, counts)
+
+    def total(self, *axes: str) -> Any:
+        """
+        Sums the counts over the given axes.
+
+        Args:
+            *axes: Facet names to sum over. Without any, the grand total is returned.
+
+        Returns:
+            FacetCube: The reduced cube, or an int when every axis is summed.
+        """
+        if not axes:
+            return int(self.counts.sum())
+        positions = [self.axes.index(_match_axis(self.axes, axis)) for axis in axes]
+        keep = [i for i in range(len(self.axes)) if i not in positions]
+        counts = self.counts.sum(axis=tuple(positions))
+        if not keep:
+            return int(counts)
+        return FacetCube(
+            [self.axes[i] for i in keep], [self.labels[i] for i in keep], counts
+        )
+
+    def to_records(self):
+        """
+        Yields the non-zero cells of the cube.
+
+        Yields:
+            dict: The facet value of each axis and the count.
+        """
+        for position in zip(*np.nonzero(self.counts)):
+            record = {axis: self.labels[i][p] for i, (axis, p) in enumerate(zip(self.axes, position))}
+            record["count"] = int(self.counts[position])
+            yield record
+
+    def __repr__(self):
+        shape = " x ".join(f"{axis}[{len(labels)}]" for axis, labels in zip(self.axes, self.labels))
+        return f"FacetCube({shape}, total={int(self.counts.sum())})"
+
+
+def _to_camel(name):
+    parts = name.split("_")
+    return parts[0] + "".join(part.title() for part in parts[1:])
+
+
+def _to_snake(name):
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name).lower()
+
+
+def _search_param(facet):
+    # The search_occurrences keyword filtering on a facet, e.g. publising_org for publishingOrg.
+    camel = _to_camel(facet)
+    return FACET_PARAMS.get(camel, _to_snake(camel))
+
+
+def _match_axis(axes, name):
+    for axis in axes:
+        if _to_snake(axis) == _to_snake(name):
+            return axis
+    raise KeyError(name)
+
+
+def _lookup(selection, axis):
+    for name, value in selection.items():
+        if _to_snake(name) == _to_snake(axis):
+            return value
+    return None
+
+
+def _as_indexer(index, size):
+    if isinstance(index, slice):
+        return np.arange(size)
+    if isinstance(index, list):
+        return np.array(index, dtype=np.intp)
+    return np.array([index], dtype=np.intp)
@@ -0,0 +1,251 @@
+import gzip
+import json
+import os
+import sqlite3
+import warnings
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+
+from .search import (
+    OccurrenceSearch,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_OFFSET,
+    DEFAULT_MAX_WORKERS,
+)
+from .sinks import NDJSONSink
+from ..utils import http_client as hc
+from ..utils.concurrency import bounded_map
+
+
+class ResumableHarvest:
+    """
+    Harvests occurrence searches page by page into gzip-compressed NDJSON part files, with progress kept in a SQLite database so an interrupted harvest can be restarted without repeating finished work.
+
+    Every page is written to a temporary file that is renamed into place before the page is marked complete, so the state never points at a partial file. On restart, completed pages are skipped and the remaining pages are fetched in parallel. Because the page plan is derived from record counts taken on the first run, a restart continues the same plan.
+
+    Searches larger than the 100,000 record offset limit can be split into partitions, each a dictionary of extra filters such as {"year": [2019]}, which are harvested independently. A partition filter replaces a search parameter of the same name.
+
+    Attributes:
+        output_dir: The directory holding part files and, by default, the state database.
+        state_path: Path of the SQLite state database.
+        page_size: Number of records per page and part file.
+        max_workers: Number of pages fetched at once.
+    """
+
+    def __init__(
+        self,
+        output_dir,
+        state_path=None,
+        page_size: int = MAX_PAGE_SIZE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        search: Optional[OccurrenceSearch] = None,
+    ):
+        self.output_dir = output_dir
+        self.state_path = state_path or os.path.join(output_dir, "harvest_state.sqlite")
+        self.page_size = min(page_size, MAX_PAGE_SIZE)
+        self.max_workers = max_workers
+        self.search = search or OccurrenceSearch()
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.state_path)
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS harvest_partitions (
+                    query_hash TEXT NOT NULL,
+                    partition INTEGER NOT NULL,
+                    params TEXT NOT NULL,
+                    record_count INTEGER NOT NULL,
+                    PRIMARY KEY (query_hash, partition)
+                )
+                """
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS harvest_pages (
+                    query_hash TEXT NOT NULL,
+                    partition INTEGER NOT NULL,
+                    page_offset INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    records INTEGER NOT NULL,
+                    completed_at TEXT NOT NULL,
+                    PRIMARY KEY (query_hash, partition, page_offset)
+                )
+                """
+            )
+
+    def run(self, partitions: Optional[List[Dict[str, Any]]] = None, **search_params):
+        """
+        Harvests a search, or continues a harvest of the same search that was interrupted.
+
+        Args:
+            partitions (list): Optional. Dictionaries of extra filters, each harvested as a separate search. Default is a single partition with no extra filters.
+            **search_params: Optional. Any keyword argument accepted by search_occurrences except limit and offset, including fields.
+
+        Returns:
+            dict: The query hash, the number of pages fetched in this run, the number of pages skipped because they were already complete, and the total number of records harvested so far.
+        """
+        partitions = partitions or [{}]
+        query_hash = self.query_hash(partitions, **search_params)
+        part_dir = os.path.join(self.output_dir, query_hash[:16])
+        os.makedirs(part_dir, exist_ok=True)
+
+        counts = self._partition_counts(query_hash, partitions, search_params)
+        done = {
+            (partition, offset)
+            for partition, offset in self._db.execute(
+                "SELECT partition, page_offset FROM harvest_pages WHERE query_hash = ?",
+                (query_hash,),
+            )
+        }
+        pages = [
+            (partition, offset)
+            for partition, count in enumerate(counts)
+            for offset in range(0, min(count, MAX_SEARCH_OFFSET), self.page_size)
+            if (partition, offset) not in done
+        ]
+
+        def fetch(task):
+            partition, offset = task
+            params = {**search_params, **partitions[partition]}
+            page = self.search.search_occurrences(
+                limit=min(self.page_size, MAX_SEARCH_OFFSET - offset), offset=offset, **params
+            )
+            if "error" in page:
+                raise RuntimeError(
+                    f"Occurrence search failed for partition {partition} at offset {offset}: {page['error']}"
+                )
+            path = os.path.join(part_dir, f"part-{partition:05d}-{offset:06d}.ndjson.gz")
+            with NDJSONSink(path + ".tmp") as sink:
+                sink.write(page.get("results", []))
+            os.replace(path + ".tmp", path)
+            return path, sink.records_written
+
+        fetched = 0
+        for (partition, offset), (path, records) in bounded_map(
+            fetch, pages, max_workers=self.max_workers
+        ):
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO harvest_pages VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        query_hash,
+                        partition,
+                        offset,
+                        path,
+                        records,
+                        datetime.now(timezone.utc).isoformat(),
+                    ),
+                )
+            fetched += 1
+
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(records), 0) FROM harvest_pages WHERE query_hash = ?",
+            (query_hash,),
+        ).fetchone()
+        return {
+            "query_hash": query_hash,
+            "pages_fetched": fetched,
+            "pages_skipped": len(done),
+            "records": total,
+        }
+
+    def parts(self, partitions: Optional[List[Dict[str, Any]]] = None, **search_params):
+        """
+        Returns the part files of a harvest in partition and offset order.
+
+        Args:
+            partitions (list): Optional. The partitions passed to run.
+            **search_params: Optional. The search parameters passed to run.
+
+        Returns:
+            list: Paths of the completed part files.
+        """
+        query_hash = self.query_hash(partitions or [{}], **search_params)
+        return [
+            path
+            for (path,) in self._db.execute(
+                "SELECT path FROM harvest_pages WHERE query_hash = ? ORDER BY partition, page_offset",
+                (query_hash,),
+            )
+        ]
+
+    def iter_records(self, partitions: Optional[List[Dict[str, Any]]] = None, **search_params):
+        """
+        Reads back the records of a harvest, one part file at a time.
+
+        Args:
+            partitions (list): Optional. The partitions passed to run.
+            **search_params: Optional. The search parameters passed to run.
+
+        Yields:
+            dict: A single occurrence record.
+        """
+        for path in self.parts(partitions, **search_params):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    yield json.loads(line)
+
+    def query_hash(self, partitions, **search_params):
+        """
+        Returns the key under which the progress of a harvest is stored.
+
+        Args:
+            partitions (list): The partitions of the harvest.
+            **search_params: The search parameters of the harvest.
+
+        Returns:
+            str: A hash of the search and its partitions.
+        """
+        return hc.query_hash(
+            {"search": search_params, "partitions": partitions, "page_size": self.page_size}
+        )
+
+    def close(self):
+        """
+        Closes the state database.
+        """
+        self._db.close()
+
+    def _partition_counts(self, query_hash, partitions, search_params):
+        stored = dict(
+            self._db.execute(
+                "SELECT partition, record_count FROM harvest_partitions WHERE query_hash = ?",
+                (query_hash,),
+            )
+        )
+        missing = [i for i in range(len(partitions)) if i not in stored]
+
+        def count(partition):
+            params = {**search_params, **partitions[partition]}
+            params.pop("fields", None)
+            page = self.search.search_occurrences(limit=0, **params)
+            if "error" in page:
+                raise RuntimeError(f"Occurrence count failed: {page['error']}")
+            return page.get("count", 0)
+
+        for partition, record_count in bounded_map(
+            count, missing, max_workers=self.max_workers
+        ):
+            if record_count > MAX_SEARCH_OFFSET:
+                warnings.warn(
+                    f"Partition {partition} holds {record_count} records but only the "
+                    f"first {MAX_SEARCH_OFFSET} can be paged; split it further."
+                )
+            with self._db:
+                self._db.execute(
+                    "INSERT INTO harvest_partitions VALUES (?, ?, ?, ?)",
+                    (
+                        query_hash,
+                        partition,
+                        json.dumps(partitions[partition], sort_keys=True, default=str),
+                        record_count,
+                    ),
+                )
+            stored[partition] = record_count
+        return [stored[i] for i in range(len(partitions))]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,340 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List
+
+from .download_index import DownloadIndex
+from .downloads import OccurrenceDownload
+from ..utils import http_client as hc
+from ..utils.concurrency import bounded_map
+
+# Download statuses after which GBIF does no further work on a download.
+FINAL_STATUSES = {"FAILED", "KILLED", "CANCELLED", "FILE_ERASED"}
+ACTIVE_STATUSES = {"PREPARING", "RUNNING", "SUSPENDED"}
+
+
+class DownloadOrchestrator:
+    """
+    Runs many occurrence downloads end to end: submits them, waits for them to finish and retrieves the files, keeping every job in a local SQLite queue so the work survives process restarts.
+
+    Jobs are submitted only while fewer than max_concurrent of them are running, in line with GBIF's per-user limit on simultaneous downloads. The status of all running jobs is polled with paged calls to get_user_download_info, limited to downloads created since the oldest running job was submitted, rather than one request per download. The polling interval doubles while nothing changes, up to max_poll_interval. Files are retrieved as soon as their download succeeds. A job whose file cannot be retrieved after max_retrieve_attempts rounds is marked ERROR.
+
+    A job is marked SUBMITTING before its request is sent. If the process stops before the download key is stored, the next round looks for a download of the same request among the user's downloads and adopts it, so the request is only sent again when GBIF never received it.
+
+    Jobs are identified by a hash of their request body, so adding the same request twice queues it once.
+
+    Attributes:
+        username: The GBIF username the downloads are made for.
+        state_path: Path of the SQLite job queue.
+        output_dir: The directory retrieved files are written to.
+        max_concurrent: Number of downloads allowed to run at once.
+        min_poll_interval: Seconds between polls while jobs are changing status.
+        max_poll_interval: Upper bound on the seconds between polls.
+        connections: Number of parallel connections used to retrieve each file.
+        max_retrieve_attempts: Number of rounds a file retrieval is tried before the job is marked ERROR.
+    """
+
+    def __init__(
+        self,
+        username,
+        password,
+        state_path="download_jobs.sqlite",
+        output_dir=".",
+        max_concurrent: int = 3,
+        min_poll_interval: float = 30,
+        max_poll_interval: float = 600,
+        connections: int = 1,
+        download: Optional[OccurrenceDownload] = None,
+        max_retrieve_attempts: int = 3,
+    ):
+        self.username = username
+        self.password = password
+        self.state_path = state_path
+        self.output_dir = output_dir
+        self.max_concurrent = max_concurrent
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.connections = connections
+        self.max_retrieve_attempts = max_retrieve_attempts
+        self.download = download or OccurrenceDownload()
+        os.makedirs(output_dir, exist_ok=True)
+        self._db = sqlite3.connect(state_path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS download_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    request_body TEXT NOT NULL,
+                    download_key TEXT,
+                    status TEXT NOT NULL,
+                    path TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    submitted_at TEXT,
+                    retrieve_attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+
+    def add(self, request_body: Dict[str, Any]) -> str:
+        """
+        Queues a download request. A request already in the queue is not added again.
+
+        Args:
+            request_body (dict): The JSON request body, as passed to request_download.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = hc.query_hash(request_body)
+        now = _now()
+        with self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO download_jobs (job_id, request_body, status, created_at, updated_at) VALUES (?, ?, 'QUEUED', ?, ?)",
+                (job_id, json.dumps(request_body), now, now),
+            )
+        return job_id
+
+    def jobs(self, status: Optional[str] = None) -> List[dict]:
+        """
+        Returns the jobs in the queue.
+
+        Args:
+            status (str): Optional. Only return jobs with this status, e.g. QUEUED, SUBMITTING, RUNNING, SUCCEEDED, RETRIEVED, FAILED or ERROR.
+
+        Returns:
+            list: One dictionary per job, in the order they were added.
+        """
+        query = "SELECT * FROM download_jobs"
+        args = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        return [dict(row) for row in self._db.execute(query + " ORDER BY created_at, job_id", args)]
+
+    def run(self, until_done: bool = True):
+        """
+        Submits, polls and retrieves jobs until none are left waiting, sleeping between rounds with adaptive backoff.
+
+        Args:
+            until_done (bool): Optional. Keep going until every job is retrieved or has failed. With False, a single round is run. Default is True.
+
+        Returns:
+            dict: The number of jobs with each status.
+        """
+        interval = self.min_poll_interval
+        while True:
+            changed = self.step()
+            if not until_done or not self._pending():
+                break
+            interval = (
+                self.min_poll_interval
+                if changed
+                else min(interval * 2, self.max_poll_interval)
+            )
+            time.sleep(interval)
+        return self.summary()
+
+    def step(self) -> bool:
+        """
+        Runs one round: recovers jobs left SUBMITTING by an interrupted run, polls the status of running jobs, retrieves the files of succeeded jobs and submits queued jobs while there is capacity.
+
+        Returns:
+            bool: Whether any job changed status.
+        """
+        changed = self._recover_submitting()
+        changed = self._poll() or changed
+        changed = self._retrieve() or changed
+        changed = self._submit() or changed
+        return changed
+
+    def summary(self) -> Dict[str, int]:
+        """
+        Returns the number of jobs with each status.
+
+        Returns:
+            dict: Statuses mapped to job counts.
+        """
+        return {
+            row["status"]: row["count"]
+            for row in self._db.execute(
+                "SELECT status, COUNT(*) AS count FROM download_jobs GROUP BY status"
+            )
+        }
+
+    def close(self):
+        """
+        Closes the job queue.
+        """
+        self._db.close()
+
+    def _poll(self):
+        rows = self._db.execute(
+            "SELECT download_key, status, submitted_at FROM download_jobs WHERE download_key IS NOT NULL AND status IN (%s)"
+            % ",".join("?" * len(ACTIVE_STATUSES)),
+            tuple(ACTIVE_STATUSES),
+        ).fetchall()
+        if not rows:
+            return False
+        active = {row["download_key"]: row["status"] for row in rows}
+        statuses: Dict[str, str] = {}
+        for download in self._user_downloads(_since(row["submitted_at"] for row in rows)):
+            if download is None:
+                return False
+            if download.get("key") in active:
+                statuses[download["key"]] = download.get("status")
+                if len(statuses) == len(active):
+                    break
+
+        changed = False
+        for key, status in statuses.items():
+            if status and status != active[key]:
+                self._update("download_key", key, status=status)
+                changed = True
+        return changed
+
+    def _recover_submitting(self):
+        jobs = self.jobs("SUBMITTING")
+        if not jobs:
+            return False
+        wanted = {_request_hash(json.loads(job["request_body"])): job for job in jobs}
+        for download in self._user_downloads(_since(job["submitted_at"] for job in jobs)):
+            if download is None:
+                # The downloads could not be listed; keep the jobs for the next round.
+                return False
+            job = wanted.pop(_request_hash(download.get("request") or {}), None)
+            if job is not None:
+                self._update(
+                    "job_id",
+                    job["job_id"],
+                    status=download.get("status") or "PREPARING",
+                    download_key=download["key"],
+                    error=None,
+                )
+            if not wanted:
+                break
+        for job in wanted.values():
+            # GBIF never received the request, so it is sent again.
+            self._update("job_id", job["job_id"], status="QUEUED")
+        return True
+
+    def _user_downloads(self, from_date, limit=100):
+        # Yields the user's downloads created since from_date, newest first, or None when a page fails.
+        offset = 0
+        while True:
+            page = self.download.get_user_download_info(
+                self.username,
+                self.username,
+                self.password,
+                from_date=from_date,
+                statistics=False,
+                limit=limit,
+                offset=offset,
+            )
+            if not isinstance(page, dict) or "error" in page:
+                yield None
+                return
+            yield from page.get("results", [])
+            if page.get("endOfRecords", True) or not page.get("results"):
+                return
+            offset += limit
+
+    def _retrieve(self):
+        succeeded = self.jobs("SUCCEEDED")
+
+        def retrieve(job):
+            path = os.path.join(self.output_dir, f"{job['download_key']}.zip")
+            return self.download.retrieve_download(
+                job["download_key"], path=path, connections=self.connections
+            )
+
+        def retrieve_safely(job):
+            try:
+                return retrieve(job)
+            except OSError as err:
+                return {"error": f"Could not write the file: {err}"}
+
+        changed = False
+        for job, result in bounded_map(retrieve_safely, succeeded, max_workers=self.max_concurrent):
+            attempts = job["retrieve_attempts"] + 1
+            if isinstance(result, str):
+                self._update("job_id", job["job_id"], status="RETRIEVED", path=result, error=None, retrieve_attempts=attempts)
+                changed = True
+            elif attempts >= self.max_retrieve_attempts:
+                self._update("job_id", job["job_id"], status="ERROR", error=json.dumps(result), retrieve_attempts=attempts)
+                changed = True
+            else:
+                # Left as SUCCEEDED so the retrieval is tried again next round.
+                self._update("job_id", job["job_id"], error=json.dumps(result), retrieve_attempts=attempts)
+        return changed
+
+    def _submit(self):
+        (running,) = self._db.execute(
+            "SELECT COUNT(*) FROM download_jobs WHERE status IN ('SUBMITTING', %s)"
+            % ",".join("?" * len(ACTIVE_STATUSES)),
+            tuple(ACTIVE_STATUSES),
+        ).fetchone()
+        changed = False
+        for job in self.jobs("QUEUED")[: max(0, self.max_concurrent - running)]:
+            self._update("job_id", job["job_id"], status="SUBMITTING", submitted_at=_now())
+            response = self.download.request_download(
+                self.username, self.password, json.loads(job["request_body"])
+            )
+            if isinstance(response, str) and response:
+                self._update("job_id", job["job_id"], status="PREPARING", download_key=response, error=None)
+                changed = True
+            elif "429" in str(response):
+                # Too many downloads are running for this user; try again next round.
+                self._update("job_id", job["job_id"], status="QUEUED")
+                break
+            else:
+                self._update("job_id", job["job_id"], status="ERROR", error=json.dumps(response))
+                changed = True
+        return changed
+
+    def _pending(self):
+        (count,) = self._db.execute(
+            "SELECT COUNT(*) FROM download_jobs WHERE status NOT IN ('RETRIEVED', 'ERROR', %s)"
+            % ",".join("?" * len(FINAL_STATUSES)),
+            tuple(FINAL_STATUSES),
+        ).fetchone()
+        return count > 0
+
+    def _update(self, column, value, **values):
+        values["updated_at"] = _now()
+        assignments = ", ".join(f"{name} = ?" for name in values)
+        with self._db:
+            self._db.execute(
+                f"UPDATE download_jobs SET {assignments} WHERE {column} = ?",
+                (*values.values(), value),
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _since(timestamps):
+    # A day of margin covers clock differences between this machine and GBIF.
+    known = [t for t in timestamps if t]
+    if not known:
+        return None
+    return (datetime.fromisoformat(min(known)) - timedelta(days=1)).date().isoformat()
+
+
+def _request_hash(request_body):
+    if request_body.get("predicate") is not None:
+        return DownloadIndex.predicate_hash(
+            request_body["predicate"], request_body.get("format", "DWCA")
+        )
+    return hc.query_hash({"sql": request_body.get("sql"), "format": request_body.get("format")})
@@ -0,0 +1,441 @@
+import json
+import re
+from typing import Any, Dict, List
+
+
+class Predicate:
+    """
+    Base class for occurrence predicates, as used by the predicate search and the download API.
+
+    Predicates can be combined with & (and), | (or) and ~ (not). Calling to_dict returns the JSON structure expected by the API, simplified so that the request stays as small as possible: nested and/or predicates are flattened, equals predicates on the same key inside an or are merged into a single in predicate, and duplicate values are dropped.
+    """
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serializes the predicate.
+
+        Returns:
+            dict: The predicate in the JSON structure used by the API.
+        """
+        return self.simplify()._serialize()
+
+    def to_json(self) -> str:
+        """
+        Serializes the predicate as compact JSON.
+
+        Returns:
+            str: The predicate as a JSON string.
+        """
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    def simplify(self) -> "Predicate":
+        """
+        Returns an equivalent predicate with redundant structure removed.
+
+        Returns:
+            Predicate: The simplified predicate.
+        """
+        return self
+
+    def _serialize(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(json.dumps(self.to_dict(), sort_keys=True))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_json()})"
+
+
+class _KeyValue(Predicate):
+    type = ""
+
+    def __init__(self, key: str, value: Any):
+        self.key = normalize_key(key)
+        self.value = value
+
+    def _serialize(self):
+        return {"type": self.type, "key": self.key, "value": _format_value(self.value)}
+
+
+class Equals(_KeyValue):
+    """
+    Matches records where key equals value.
+
+    Attributes:
+        key: The search parameter, e.g. "TAXON_KEY". snake_case and camelCase names are converted.
+        value: The value to match.
+        match_case: Optional. Whether string matching is case sensitive.
+    """
+
+    type = "equals"
+
+    def __init__(self, key: str, value: Any, match_case: bool = None):
+        super().__init__(key, value)
+        self.match_case = match_case
+
+    def _serialize(self):
+        serialized = super()._serialize()
+        if self.match_case is not None:
+            serialized["matchCase"] = self.match_case
+        return serialized
+
+
+class GreaterThan(_KeyValue):
+    """
+    Matches records where key is greater than value.
+    """
+
+    type = "greaterThan"
+
+
+class GreaterThanOrEquals(_KeyValue):
+    """
+    Matches records where key is greater than or equal to value.
+    """
+
+    type = "greaterThanOrEquals"
+
+
+class LessThan(_KeyValue):
+    """
+    Matches records where key is less than value.
+    """
+
+    type = "lessThan"
+
+
+class LessThanOrEquals(_KeyValue):
+    """
+    Matches records where key is less than or equal to value.
+    """
+
+    type = "lessThanOrEquals"
+
+
+class Like(_KeyValue):
+    """
+    Matches records where key matches a pattern, using ? for a single character and * for any number of characters.
+    """
+
+    type = "like"
+
+
+class In(Predicate):
+    """
+    Matches records where key equals any of the values.
+
+    Attributes:
+        key: The search parameter.
+        values: The values to match.
+    """
+
+    def __init__(self, key: str, values):
+        self.key = normalize_key(key)
+        self.values = list(values)
+
+    def simplify(self):
+        values = _unique(self.values)
+        if len(values) == 1:
+            return Equals(self.key, values[0])
+        return In(self.key, values)
+
+    def _serialize(self):
+        return {
+            "type": "in",
+            "key": self.key,
+            "values": [_format_value(value) for value in self.values],
+        }
+
+
+class Range(Predicate):
+    """
+    Matches records where key lies between lower and upper, both inclusive. Either bound may be None for an open range.
+
+    Attributes:
+        key: The search parameter.
+        lower: The lower bound.
+        upper: The upper bound.
+    """
+
+    def __init__(self, key: str, lower: Any = None, upper: Any = None):
+        if lower is None and upper is None:
+            raise ValueError("A range needs at least one bound.")
+        self.key = normalize_key(key)
+        self.lower = lower
+        self.upper = upper
+
+    def simplify(self):
+        if self.lower is not None and self.lower == self.upper:
+            return Equals(self.key, self.lower)
+        bounds = []
+        if self.lower is not None:
+            bounds.append(GreaterThanOrEquals(self.key, self.lower))
+        if self.upper is not None:
+            bounds.append(LessThanOrEquals(self.key, self.upper))
+        return bounds[0] if len(bounds) == 1 else And(*bounds)
+
+
+class Within(Predicate):
+    """
+    Matches records inside a WKT POLYGON or MULTIPOLYGON.
+
+    Attributes:
+        geometry: The WKT geometry.
+    """
+
+    def __init__(self, geometry: str):
+        self.geometry = geometry
+
+    def _serialize(self):
+        return {"type": "within", "geometry": self.geometry}
+
+
+class GeoDistance(Predicate):
+    """
+    Matches records within a distance of a point.
+
+    Attributes:
+        latitude: The latitude of the point.
+        longitude: The longitude of the point.
+        distance: The distance with its unit, e.g. "5km" or "500m".
+    """
+
+    def __init__(self, latitude, longitude, distance: str):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.distance = distance
+
+    def _serialize(self):
+        return {
+            "type": "geoDistance",
+            "latitude": _format_value(self.latitude),
+            "longitude": _format_value(self.longitude),
+            "distance": self.distance,
+        }
+
+
+class IsNull(Predicate):
+    """
+    Matches records where the parameter has no value.
+    """
+
+    type = "isNull"
+
+    def __init__(self, parameter: str):
+        self.parameter = normalize_key(parameter)
+
+    def _serialize(self):
+        return {"type": self.type, "parameter": self.parameter}
+
+
+class IsNotNull(IsNull):
+    """
+    Matches records where the parameter has a value.
+    """
+
+    type = "isNotNull"
+
+
+class Not(Predicate):
+    """
+    Negates a predicate.
+
+    Attributes:
+        predicate: The predicate to negate.
+    """
+
+    def __init__(self, predicate: Predicate):
+        self.predicate = _as_predicate(predicate)
+
+    def simplify(self):
+        inner = self.predicate.simplify()
+        if isinstance(inner, Not):
+            return inner.predicate
+        if isinstance(inner, IsNull) and not isinstance(inner, IsNotNull):
+            return IsNotNull(inner.parameter)
+        if isinstance(inner, IsNotNull):
+            return IsNull(inner.parameter)
+        return Not(inner)
+
+    def _serialize(self):
+        return {"type": "not", "predicate": self.predicate._serialize()}
+
+
+class _Compound(Predicate):
+    type = ""
+
+    def __init__(self, *predicates: Predicate):
+        if not predicates:
+            raise ValueError(f"An {self.type} predicate needs at least one predicate.")
+        self.predicates = [_as_predicate(p) for p in predicates]
+
+    def simplify(self):
+        flat: List[Predicate] = []
+        for predicate in self.predicates:
+            predicate = predicate.simplify()
+            if type(predicate) is type(self):
+                flat.extend(predicate.predicates)
+            else:
+                flat.append(predicate)
+        flat = _unique(flat)
+        if isinstance(self, Or):
+            flat = _merge_equals(flat)
+        return flat[0] if len(flat) == 1 else type(self)(*flat)
+
+    def _serialize(self):
+        return {
+            "type": self.type,
+            "predicates": [p._serialize() for p in self.predicates],
+        }
+
+
+class And(_Compound):
+    """
+    Matches records matching all of the predicates.
+    """
+
+    type = "and"
+
+
+class Or(_Compound):
+    """
+    Matches records matching any of the predicates.
+    """
+
+    type = "or"
+
+
+def normalize_key(key: str) -> str:
+    """
+    Converts a search parameter name to the upper snake case used by predicates, e.g. taxon_key or taxonKey to TAXON_KEY.
+
+    Args:
+        key (str): The parameter name.
+
+    Returns:
+        str: The predicate key.
+    """
+    if key.isupper():
+        return key
+    return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", key).upper()
+
+
+def from_dict(data: Dict[str, Any]) -> Predicate:
+    """
+    Builds a Predicate from its JSON structure.
+
+    Args:
+        data (dict): A predicate as used by the API.
+
+    Returns:
+        Predicate: The equivalent predicate object.
+    """
+    kind = data["type"]
+    if kind in ("and", "or"):
+        compound = And if kind == "and" else Or
+        return compound(*(from_dict(p) for p in data["predicates"]))
+    if kind == "not":
+        return Not(from_dict(data["predicate"]))
+    if kind == "in":
+        return In(data["key"], data["values"])
+    if kind == "within":
+        return Within(data["geometry"])
+    if kind == "geoDistance":
+        return GeoDistance(data["latitude"], data["longitude"], data["distance"])
+    if kind == "isNull":
+        return IsNull(data["parameter"])
+    if kind == "isNotNull":
+        return IsNotNull(data["parameter"])
+    if kind == "equals":
+        return Equals(data["key"], data["value"], data.get("matchCase"))
+    for cls in (GreaterThan, GreaterThanOrEquals, LessThan, LessThanOrEquals, Like):
+        if cls.type == kind:
+            return cls(data["key"], data["value"])
+    raise ValueError(f"Unknown predicate type: {kind}")
+
+
+def canonical_dict(predicate) -> Dict[str, Any]:
+    """
+    Returns a canonical JSON structure of a predicate, in which equivalent predicates compare equal: the predicate is simplified, the members of and/or predicates are sorted and the values of in predicates are sorted.
+
+    Args:
+        predicate (Predicate or dict): The predicate.
+
+    Returns:
+        dict: The canonical structure. It is also a valid predicate.
+    """
+    return _canonical(_as_predicate(predicate).to_dict())
+
+
+def _canonical(data):
+    data = dict(data)
+    if "predicates" in data:
+        data["predicates"] = sorted(
+            (_canonical(p) for p in data["predicates"]),
+            key=lambda p: json.dumps(p, sort_keys=True),
+        )
+    if "predicate" in data:
+        data["predicate"] = _canonical(data["predicate"])
+    if "values" in data:
+        data["values"] = sorted(set(data["values"]), key=lambda v: (str(type(v)), v))
+    return data
+
+
+def _as_predicate(predicate):
+    return from_dict(predicate) if isinstance(predicate, dict) else predicate
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+def _unique(items):
+    seen = set()
+    unique = []
+    for item in items:
+        marker = json.dumps(item.to_dict(), sort_keys=True) if isinstance(item, Predicate) else item
+        if marker not in seen:
+            seen.add(marker)
+            unique.append(item)
+    return unique
+
+
+def _merge_equals(predicates):
+    # Inside an or, equals/in predicates on the same key collapse into one in predicate.
+    values: Dict[str, list] = {}
+    merged: List[Predicate] = []
+    for predicate in predicates:
+        mergeable = (
+            isinstance(predicate, Equals) and predicate.match_case is None
+        ) or isinstance(predicate, In)
+        if not mergeable:
+            merged.append(predicate)
+            continue
+        if predicate.key not in values:
+            values[predicate.key] = []
+            merged.append(predicate.key)
+        if isinstance(predicate, In):
+            values[predicate.key].extend(predicate.values)
+        else:
+            values[predicate.key].append(predicate.value)
+    return [
+        In(item, values[item]).simplify() if isinstance(item, str) else item
+        for item in merged
+    ]
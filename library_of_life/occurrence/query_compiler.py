@@ -0,0 +1,218 @@
+import inspect
+from typing import Dict, Any, List
+
+from .predicates import (
+    Predicate,
+    Equals,
+    In,
+    Range,
+    Within,
+    GeoDistance,
+    And,
+    Or,
+    from_dict,
+)
+from .search import OccurrenceSearch
+
+# search_occurrences parameters that control paging, faceting or output rather than filter records.
+NON_FILTER_PARAMS = {
+    "self",
+    "highlight",
+    "query",
+    "limit",
+    "offset",
+    "facet",
+    "facet_mincount",
+    "facet_multiselect",
+    "facet_limit",
+    "facet_offset",
+    "fields",
+}
+
+# Parameters whose name in search_occurrences differs from the predicate key.
+PARAM_ALIASES = {
+    "decimal_latitide": "decimal_latitude",
+    "publising_org": "publishing_org",
+}
+
+# Parameters accepting "lower,upper" ranges as text, in addition to those typed as tuples.
+TEXT_RANGE_PARAMS = {
+    "year",
+    "month",
+    "event_date",
+    "last_interpreted",
+    "modified",
+    "start_day_of_year",
+    "end_day_of_year",
+    "organism_quantity",
+    "relative_organism_quantity",
+    "sample_size_value",
+}
+
+
+def search_filters() -> Dict[str, str]:
+    """
+    Returns the filters accepted by OccurrenceSearch.search_occurrences, read from its signature, with the predicate key of each.
+
+    Returns:
+        dict: Parameter names, including the misspelled aliases, mapped to predicate keys such as TAXON_KEY.
+    """
+    signature = inspect.signature(OccurrenceSearch.search_occurrences)
+    return {
+        name: PARAM_ALIASES.get(name, name).upper()
+        for name in signature.parameters
+        if name not in NON_FILTER_PARAMS
+    }
+
+
+def to_predicate(**search_params) -> Predicate:
+    """
+    Compiles search_occurrences keyword filters into a download predicate locally, as a replacement for the convert_query_into_download_predicate request.
+
+    Lists become in predicates, or an or of ranges when they hold ranges. Tuples, and "lower,upper" text for date and count fields, become ranges with "*" or None as an open bound. Geometries become within predicates and geo_distance a geoDistance predicate. All filters are combined with and.
+
+    Args:
+        **search_params: Filters accepted by search_occurrences. Paging, facet and output parameters are not allowed.
+
+    Returns:
+        Predicate: The predicate. Call to_dict for the JSON structure of a download request.
+    """
+    filters = search_filters()
+    unknown = sorted(set(search_params) - set(filters))
+    if unknown:
+        raise ValueError(f"Not occurrence search filters: {', '.join(unknown)}")
+    range_params = _range_params()
+
+    predicates = []
+    for name, value in search_params.items():
+        if value is None:
+            continue
+        key = filters[name]
+        if name == "geometry":
+            values = value if isinstance(value, list) else [value]
+            predicates.append(_any([Within(geometry) for geometry in values]))
+        elif name == "geo_distance":
+            latitude, longitude, distance = [part.strip() for part in value.split(",")]
+            predicates.append(GeoDistance(latitude, longitude, distance))
+        else:
+            values = value if isinstance(value, (list, set)) else [value]
+            ranges = [_range(key, v) for v in values if _is_range(name, v, range_params)]
+            plain = [v for v in values if not _is_range(name, v, range_params)]
+            alternatives = list(ranges)
+            if len(plain) == 1:
+                alternatives.append(Equals(key, plain[0]))
+            elif plain:
+                alternatives.append(In(key, plain))
+            predicates.append(_any(alternatives))
+    if not predicates:
+        raise ValueError("At least one filter is required.")
+    return predicates[0] if len(predicates) == 1 else And(*predicates)
+
+
+def to_search_params(predicate) -> Dict[str, Any]:
+    """
+    Maps a simple download predicate back to search_occurrences keyword filters.
+
+    Supported are equals and in predicates, ranges written as greaterThanOrEquals and lessThanOrEquals on the same key, within and geoDistance, combined with and, and or predicates over a single key.
+
+    Args:
+        predicate (Predicate or dict): The predicate.
+
+    Returns:
+        dict: Keyword arguments for search_occurrences.
+    """
+    data = (from_dict(predicate) if isinstance(predicate, dict) else predicate).to_dict()
+    members = data["predicates"] if data["type"] == "and" else [data]
+    # The correct spelling wins where search_occurrences accepts both.
+    params_by_key = {
+        key: name
+        for name, key in sorted(
+            search_filters().items(), key=lambda item: item[0] not in PARAM_ALIASES
+        )
+    }
+
+    params: Dict[str, Any] = {}
+    bounds: Dict[str, List[Any]] = {}
+    for member in members:
+        kind = member["type"]
+        if kind == "within":
+            params.setdefault("geometry", []).append(member["geometry"])
+        elif kind == "geoDistance":
+            params["geo_distance"] = f"{member['latitude']},{member['longitude']},{member['distance']}"
+        elif kind in ("greaterThanOrEquals", "lessThanOrEquals"):
+            entry = bounds.setdefault(member["key"], [None, None])
+            entry[0 if kind == "greaterThanOrEquals" else 1] = member["value"]
+        elif kind in ("equals", "in"):
+            values = member["values"] if kind == "in" else [member["value"]]
+            params[_param_name(member["key"], params_by_key)] = values
+        elif kind == "or":
+            values, keys = [], set()
+            for alternative in member["predicates"]:
+                key, alternative_values = _alternative(alternative)
+                keys.add(key)
+                values.extend(alternative_values)
+            if len(keys) != 1:
+                raise ValueError("Only or predicates over a single key can be mapped to search parameters.")
+            name = "geometry" if keys == {None} else _param_name(keys.pop(), params_by_key)
+            params[name] = values
+        else:
+            raise ValueError(f"{kind} predicates cannot be mapped to search parameters.")
+    for key, (lower, upper) in bounds.items():
+        params[_param_name(key, params_by_key)] = f"{'*' if lower is None else lower},{'*' if upper is None else upper}"
+    return params
+
+
+def _alternative(predicate):
+    # Returns the key and search values of one member of an or predicate.
+    kind = predicate["type"]
+    if kind == "within":
+        return None, [predicate["geometry"]]
+    if kind == "equals":
+        return predicate["key"], [predicate["value"]]
+    if kind == "in":
+        return predicate["key"], list(predicate["values"])
+    bounds = predicate["predicates"] if kind == "and" else [predicate]
+    keys = {bound.get("key") for bound in bounds}
+    kinds = {bound["type"] for bound in bounds}
+    if len(keys) == 1 and kinds <= {"greaterThanOrEquals", "lessThanOrEquals"}:
+        lower = next((b["value"] for b in bounds if b["type"] == "greaterThanOrEquals"), "*")
+        upper = next((b["value"] for b in bounds if b["type"] == "lessThanOrEquals"), "*")
+        return keys.pop(), [f"{lower},{upper}"]
+    raise ValueError(f"{kind} predicates cannot be mapped to search parameters.")
+
+
+def _range_params():
+    signature = inspect.signature(OccurrenceSearch.search_occurrences)
+    typed = {
+        name
+        for name, parameter in signature.parameters.items()
+        if "tuple" in str(parameter.annotation) and "list" not in str(parameter.annotation)
+    }
+    return typed | TEXT_RANGE_PARAMS
+
+
+def _is_range(name, value, range_params):
+    if isinstance(value, tuple):
+        return True
+    return name in range_params and isinstance(value, str) and "," in value
+
+
+def _range(key, value):
+    lower, upper = value if isinstance(value, tuple) else value.split(",", 1)
+    lower = None if lower in (None, "*", "") else lower
+    upper = None if upper in (None, "*", "") else upper
+    if isinstance(lower, str):
+        lower = lower.strip()
+    if isinstance(upper, str):
+        upper = upper.strip()
+    return Range(key, lower, upper)
+
+
+def _any(predicates):
+    return predicates[0] if len(predicates) == 1 else Or(*predicates)
+
+
+def _param_name(key, params_by_key):
+    if key not in params_by_key:
+        raise ValueError(f"{key} is not an occurrence search filter.")
+    return params_by_key[key]
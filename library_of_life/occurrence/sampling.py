@@ -0,0 +1,193 @@
+import random
+import warnings
+from datetime import datetime, timezone
+from typing import Optional, Dict, List
+
+from .facets import FacetAggregator, _search_param
+from .search import (
+    OccurrenceSearch,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_OFFSET,
+    DEFAULT_MAX_WORKERS,
+)
+from .sync import _split_range
+from ..utils.concurrency import bounded_map
+
+# The date every record carries, used to split strata too large to page through.
+SPLIT_FIELD = "last_interpreted"
+
+
+class OccurrenceSampler:
+    """
+    Draws stratified random samples of occurrences from a search without downloading it.
+
+    Facet counts of the stratifying field are used to split the sample size across strata in proportion to their size. Within each stratum, random offsets are drawn and fetched concurrently. Records are fetched in blocks of block_size consecutive records from each random offset: a block size of 1 gives a simple random sample within each stratum at the cost of one request per record, while larger blocks trade some independence for far fewer requests.
+
+    Offsets are drawn over the whole stratum. Only the first 100,000 records of a search can be reached by offset, so a stratum larger than that is split in two by last_interpreted date, and each half again while it is too large, until every sampled offset falls in a piece that can be paged. Only the pieces holding sampled offsets are counted, so the number of extra requests grows with the sample size rather than with the stratum. Records interpreted on a single day beyond the first 100,000 cannot be reached this way. When a stratum yields fewer records than allocated, for that reason or because records changed since the facet counts were taken, a warning names the strata and their shortfall.
+
+    Attributes:
+        search: The OccurrenceSearch client used for requests.
+        block_size: Number of consecutive records fetched per random offset.
+        max_workers: Number of requests issued at once.
+    """
+
+    def __init__(
+        self,
+        search: Optional[OccurrenceSearch] = None,
+        block_size: int = 1,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        if not 1 <= block_size <= MAX_PAGE_SIZE:
+            raise ValueError(f"block_size must be between 1 and {MAX_PAGE_SIZE}.")
+        self.search = search or OccurrenceSearch()
+        self.block_size = block_size
+        self.max_workers = max_workers
+
+    def allocate(self, n: int, stratum_counts: Dict[str, int]) -> Dict[str, int]:
+        """
+        Splits a sample size across strata in proportion to their counts, using largest remainders so the allocations add up to n. No stratum is allocated more records than it holds.
+
+        Args:
+            n (int): The total sample size.
+            stratum_counts (dict): Stratum values mapped to their record counts.
+
+        Returns:
+            dict: Stratum values mapped to the number of records to sample.
+        """
+        total = sum(stratum_counts.values())
+        if total == 0:
+            return {}
+        n = min(n, total)
+        quotas = {s: n * c / total for s, c in stratum_counts.items()}
+        allocation = {s: int(q) for s, q in quotas.items()}
+        remaining = n - sum(allocation.values())
+        for s in sorted(quotas, key=lambda s: quotas[s] - allocation[s], reverse=True):
+            if remaining == 0:
+                break
+            if allocation[s] < stratum_counts[s]:
+                allocation[s] += 1
+                remaining -= 1
+        return {s: a for s, a in allocation.items() if a > 0}
+
+    def sample(
+        self,
+        n: int,
+        stratify_by: str = "year",
+        seed: Optional[int] = None,
+        **search_params,
+    ) -> List[dict]:
+        """
+        Returns a stratified random sample of occurrences matching a search.
+
+        Args:
+            n (int): The sample size.
+            stratify_by (str): Optional. The facet used as strata, e.g. "year", "country" or "basisOfRecord". Default is year.
+            seed (int): Optional. Seed for the random offsets, for reproducible samples.
+            **search_params: Optional. Any filter accepted by search_occurrences, including fields. last_interpreted is managed by the sampler.
+
+        Returns:
+            list: The sampled records. Each carries the stratum it was drawn from under "_stratum". Fewer than n when a stratum cannot be filled, with a warning.
+        """
+        if SPLIT_FIELD in search_params:
+            raise ValueError(f"{SPLIT_FIELD} is managed by OccurrenceSampler.")
+        rng = random.Random(seed)
+        count_params = {k: v for k, v in search_params.items() if k != "fields"}
+        counts = FacetAggregator(
+            search=self.search, max_workers=self.max_workers
+        ).facet_counts(stratify_by, **count_params)
+        allocation = self.allocate(n, counts)
+        filter_name = _search_param(stratify_by)
+
+        plans = []
+        for stratum, size in allocation.items():
+            count = counts[stratum]
+            # The last block may be partial; drawing one block more than needed covers it.
+            blocks = -(-count // self.block_size)
+            needed = -(-size // self.block_size)
+            chosen, taken = [], 0
+            for start in rng.sample(range(blocks), min(needed + 1, blocks)):
+                if taken >= size:
+                    break
+                length = min(self.block_size, count - start * self.block_size)
+                chosen.append((start, length))
+                taken += length
+            intervals, taken = [], 0
+            for start, length in sorted(chosen):
+                limit = min(length, size - taken)
+                intervals.append((start * self.block_size, limit))
+                taken += limit
+            plans.append((stratum, count, intervals))
+
+        def locate(plan):
+            stratum, count, intervals = plan
+            return self._locate({**count_params, filter_name: [stratum]}, count, intervals)
+
+        tasks = [
+            (stratum, date_range, offset, limit)
+            for (stratum, _, _), located in bounded_map(
+                locate, plans, max_workers=self.max_workers
+            )
+            for date_range, offset, limit in located
+        ]
+
+        def fetch(task):
+            stratum, date_range, offset, limit = task
+            params = {**search_params, filter_name: [stratum]}
+            if date_range is not None:
+                params[SPLIT_FIELD] = date_range
+            page = self.search.search_occurrences(limit=limit, offset=offset, **params)
+            if "error" in page:
+                raise RuntimeError(f"Occurrence search failed: {page['error']}")
+            return page.get("results", [])
+
+        sample = []
+        obtained = {stratum: 0 for stratum in allocation}
+        for (stratum, _, _, _), records in bounded_map(
+            fetch, tasks, max_workers=self.max_workers
+        ):
+            for record in records:
+                record["_stratum"] = stratum
+                sample.append(record)
+            obtained[stratum] += len(records)
+        shortfall = {
+            stratum: size - obtained[stratum]
+            for stratum, size in allocation.items()
+            if obtained[stratum] < size
+        }
+        if shortfall:
+            warnings.warn(
+                f"Some strata could not be filled; records missing per stratum: {shortfall}."
+            )
+        return sample
+
+    def _locate(self, params, count, intervals, lower=None, upper=None):
+        # Returns (date range, offset, limit) triples that reach the given (offset, limit)
+        # intervals of a search holding count records, halving the date range while it is too large.
+        date_range = None if upper is None else f"{lower or '*'},{upper}"
+        if count <= MAX_SEARCH_OFFSET or (lower is not None and lower >= upper):
+            return [
+                (date_range, offset, min(limit, MAX_SEARCH_OFFSET - offset))
+                for offset, limit in intervals
+                if offset < MAX_SEARCH_OFFSET
+            ]
+        upper = upper or datetime.now(timezone.utc).date().isoformat()
+        (first_lower, first_upper), (second_lower, second_upper) = _split_range(lower, upper, count)
+        page = self.search.search_occurrences(
+            limit=0, **{**params, SPLIT_FIELD: f"{first_lower or '*'},{first_upper}"}
+        )
+        if "error" in page:
+            raise RuntimeError(f"Occurrence count failed: {page['error']}")
+        head = page.get("count", 0)
+        first, second = [], []
+        for offset, limit in intervals:
+            if offset < head:
+                first.append((offset, min(limit, head - offset)))
+            if offset + limit > head:
+                start = max(offset, head)
+                second.append((start - head, offset + limit - start))
+        located = []
+        if first:
+            located += self._locate(params, head, first, first_lower, first_upper)
+        if second:
+            located += self._locate(params, count - head, second, second_lower, second_upper)
+        return located
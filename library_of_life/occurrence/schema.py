@@ -0,0 +1,160 @@
+import threading
+from typing import Optional, Dict, Any
+
+from .download_formats import DownloadFormats
+
+# DownloadFormats methods describing each download format.
+DESCRIBE_METHODS = {
+    "dwca": "describe_dwca_fields",
+    "simple_csv": "describe_simple_csv_fields",
+    "simple_avro": "describe_simple_avro_fields",
+    "simple_parquet": "describe_simple_parquet_fields",
+    "species_list": "describe_species_list_fields",
+    "sql": "describe_sql_fields",
+}
+
+_cache: Dict[str, Dict[str, Dict[str, str]]] = {}
+_lock = threading.Lock()
+
+
+def field_types(
+    download_format: str = "dwca",
+    formats: Optional[DownloadFormats] = None,
+    refresh: bool = False,
+) -> Dict[str, Dict[str, str]]:
+    """
+    Returns the field types of a download format, from the describe endpoints of DownloadFormats. Descriptions are fetched once per process and cached.
+
+    The descriptions are experimental and their layout differs between formats, so every list of field objects with a name and a type, term or description is collected, wherever it appears. Fields without a type are treated as strings. Fields are grouped by the key of the section they were found in, e.g. "interpreted" or "verbatim", and the top level is grouped under "". Each field is listed under its name and, when given, under its term URI.
+
+    Args:
+        download_format (str): Optional. One of dwca, simple_csv, simple_avro, simple_parquet, species_list or sql. Default is dwca.
+        formats (DownloadFormats): Optional. The client used to fetch the description.
+        refresh (bool): Optional. Fetch the description again instead of using the cache.
+
+    Returns:
+        dict: Section names mapped to dictionaries of field names and term URIs to upper-case type names, e.g. {"interpreted": {"year": "INTEGER", ...}}.
+    """
+    with _lock:
+        if not refresh and download_format in _cache:
+            return _cache[download_format]
+    formats = formats or DownloadFormats()
+    description = getattr(formats, DESCRIBE_METHODS[download_format])()
+    if isinstance(description, dict) and "error" in description:
+        raise RuntimeError(
+            f"Could not describe the {download_format} format: {description['error']}"
+        )
+    sections: Dict[str, Dict[str, str]] = {}
+    _collect_fields(description, "", sections)
+    with _lock:
+        _cache[download_format] = sections
+    return sections
+
+
+def section_types(sections: Dict[str, Dict[str, str]], name: str) -> Dict[str, str]:
+    """
+    Picks the field types of one section, e.g. the interpreted fields for occurrence.txt.
+
+    Args:
+        sections (dict): The result of field_types.
+        name (str): A section name or a file name such as "verbatim.txt". Occurrence files match the interpreted section.
+
+    Returns:
+        dict: Field names and term URIs mapped to types. All sections merged when none matches.
+    """
+    stem = name.rsplit("/", 1)[-1].split(".", 1)[0].casefold()
+    candidates = [stem] + (["interpreted"] if stem == "occurrence" else [])
+    for candidate in candidates:
+        for section, types in sections.items():
+            if section.casefold() == candidate:
+                return types
+    merged: Dict[str, str] = {}
+    for types in sections.values():
+        for field, field_type in types.items():
+            merged.setdefault(field, field_type)
+    return merged
+
+
+def convert(value: Optional[str], field_type: Optional[str], array_separator: str = ";") -> Any:
+    """
+    Converts a value read from a text download to the Python type of its field. Empty values become None, and values that do not parse are returned unchanged.
+
+    Args:
+        value (str): The raw value.
+        field_type (str): The field type, e.g. INTEGER, LONG, DOUBLE, BOOLEAN or ARRAY<STRING>. Strings are returned as they are.
+        array_separator (str): Optional. The separator of multi-value fields. Default is ";".
+
+    Returns:
+        Any: The converted value.
+    """
+    if value is None or value == "":
+        return None
+    converter = converter_for(field_type, array_separator)
+    return value if converter is None else converter(value)
+
+
+def converter_for(field_type: Optional[str], array_separator: str = ";"):
+    """
+    Returns the function converting raw text to a field type, so it can be looked up once per column.
+
+    Args:
+        field_type (str): The field type.
+        array_separator (str): Optional. The separator of multi-value fields. Default is ";".
+
+    Returns:
+        callable: A function of one non-empty string, or None for string fields.
+    """
+    field_type = (field_type or "STRING").upper()
+    if field_type.startswith("ARRAY") or field_type.startswith("LIST"):
+        return lambda value: value.split(array_separator)
+    base = _CONVERTERS.get(field_type)
+    if base is None:
+        return None
+
+    def safe(value):
+        try:
+            return base(value)
+        except ValueError:
+            return value
+
+    return safe
+
+
+def _parse_bool(value):
+    lowered = value.lower()
+    if lowered in ("true", "t", "1"):
+        return True
+    if lowered in ("false", "f", "0"):
+        return False
+    raise ValueError(value)
+
+
+_CONVERTERS = {
+    "INT": int,
+    "INTEGER": int,
+    "LONG": int,
+    "BIGINT": int,
+    "SHORT": int,
+    "DOUBLE": float,
+    "FLOAT": float,
+    "DECIMAL": float,
+    "BOOLEAN": _parse_bool,
+}
+
+
+def _collect_fields(node, section, sections):
+    if isinstance(node, list):
+        for item in node:
+            if isinstance(item, dict) and "name" in item and (
+                {"type", "term", "description"} & item.keys()
+            ):
+                types = sections.setdefault(section, {})
+                field_type = str(item.get("type") or "STRING").upper()
+                types[item["name"]] = field_type
+                if item.get("term"):
+                    types[item["term"]] = field_type
+            else:
+                _collect_fields(item, section, sections)
+    elif isinstance(node, dict):
+        for key, value in node.items():
+            _collect_fields(value, key if key not in ("fields", "columns") else section, sections)
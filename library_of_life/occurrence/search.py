@@ -1,12 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
 
 import requests_cache
 
 from ..gbif_root import GBIF
 from ..utils import http_client as hc
+from .predicates import Predicate
 
 base_url = GBIF().base_url
 
+# Paging limits enforced by the occurrence search service.
+MAX_PAGE_SIZE = 300
+MAX_SEARCH_OFFSET = 100000
+
+# Number of requests issued at once when a search is fanned out.
+DEFAULT_MAX_WORKERS = 8
+
 
 class OccurrenceSearch:
     """
@@ -175,6 +184,8 @@ class OccurrenceSearch:
         facet_limit: Optional[int] = None,
         facet_offset: Optional[int] = None,
         publishing_country: Optional[list[str]] = None,
+        decimal_latitude: Optional[tuple] = None,
+        fields: Optional[list[str]] = None,
     ):
         """
         Returns results of full search across all occurrences.
@@ -195,7 +206,7 @@ class OccurrenceSearch:
             dataset_id (list[str]): Optional. The ID of the dataset. Example : https://doi.org/10.1594/PANGAEA.315492
             dataset_key (list[str]): Optional. The occurrence dataset key (a UUID). Example : 13b70480-bd69-11dd-b15f-b8a03c50a862
             dataset_name (list[str]): Optional. The exact name of the dataset.
-            decimal_latitude (tuple): Optional. Latitude in decimal degrees between -90° and 90° based on WGS 84. Supports range queries. Example : 40.5,45
+            decimal_latitude (tuple): Optional. Latitude in decimal degrees between -90° and 90° based on WGS 84. Supports range queries. Example : 40.5,45. The misspelt decimal_latitide is still accepted for backwards compatibility.
             degree_of_establishment (list[str]): Optional. The degree to which an organism survives, reproduces and expands its range at the given place and time, as defined in the GBIF DegreeOfEstablishment vocabulary. Example : Invasive
             decimal_longitude (tuple): Optional. Longitude in decimals between -180 and 180 based on WGS 84. Supports range queries. Example : -120,-95.5
             depth (tuple): Optional. Depth in metres relative to altitude. For example 10 metres below a lake surface with given altitude. Example : 10,20
@@ -306,9 +317,12 @@ class OccurrenceSearch:
             facet_limit (int): Optional. Facet parameters allow paging requests using the parameters facetOffset and facetLimit.
             facet_offset (int): Optional. Facet parameters allow paging requests using the parameters facetOffset and facetLimit.
             publishing_country (list[str]): Optional. The 2-letter country code (as per ISO-3166-1) of the owning organization's country. See this endpoint's docs for available values.
+            fields (list[str]): Optional. Occurrence fields to keep in each result, e.g. ["key", "scientificName", "decimalLatitude", "decimalLongitude"]. All other fields are dropped as soon as the page is decoded. This is applied locally and is not sent to the API.
+
+        Large multi-value filters, e.g. thousands of taxon_key or gbif_id values, are split automatically into sub-queries short enough for the server. The sub-queries run concurrently and the first page of each is merged: results are deduplicated by occurrence key and trimmed to limit, the count is the sum of the sub-query counts and so only an upper bound ("countIsUpperBound" is set), and facet counts are summed from each sub-query's top values and so may be incomplete ("facetsApproximate" is set). The offset applies to each sub-query, so use iterate_occurrences to page through a split search.
 
         Returns:
-            dict: A dictionary containing the data.
+            dict: A dictionary containing the data, with the parameters of each sub-query under "subqueries" when the search was split. A dictionary with error information when the query is too long and cannot be split.
         """
         params: Dict[str, Any] = {}
         params_list = [
@@ -327,7 +341,10 @@ class OccurrenceSearch:
             ("datasetId", dataset_id),
             ("datasetKey", dataset_key),
             ("datasetName", dataset_name),
-            ("decimalLatitide", decimal_latitide),
+            (
+                "decimalLatitude",
+                decimal_latitude if decimal_latitude is not None else decimal_latitide,
+            ),
             ("degreeOfEstablishment", degree_of_establishment),
             ("decimalLongitude", decimal_longitude),
             ("depth", depth),
@@ -440,7 +457,124 @@ class OccurrenceSearch:
             ("publishingCountry", publishing_country),
         ]
         hc.add_params(params, params_list)
-        return hc.get_with_params(base_url + self.endpoint, params=params)
+        params = hc.canonicalize_params(params)
+        try:
+            chunks = hc.split_params(base_url + self.endpoint, params)
+        except ValueError as err:
+            return {"error": str(err)}
+        if len(chunks) == 1:
+            response = hc.get_with_params(base_url + self.endpoint, params=params)
+        else:
+            response = self._search_chunks(chunks, limit)
+        if fields is not None and "results" in response:
+            response["results"] = [
+                hc.select_fields(record, fields) for record in response["results"]
+            ]
+        return response
+
+    def iterate_occurrences(
+        self,
+        page_size: int = MAX_PAGE_SIZE,
+        max_records: Optional[int] = None,
+        **search_params,
+    ):
+        """
+        Pages through the results of search_occurrences, yielding records one at a time. Only the current page is held in memory, so the output can be streamed into a sink (see library_of_life.occurrence.sinks) without collecting every page in a list.
+
+        A search too long for one URL is split into sub-queries as described in search_occurrences, and each sub-query is paged through in turn, so the 100,000 offset limit applies to each of them. Sub-queries can match the same record, so the keys of every record yielded are kept in memory to skip duplicates, which grows with the number of records.
+
+        Args:
+            page_size (int): Optional. Number of records requested per page. The service caps this at 300. Default is 300.
+            max_records (int): Optional. Stop after this many records. The service does not page beyond an offset of 100,000 regardless of this value.
+            **search_params: Optional. Any keyword argument accepted by search_occurrences, including fields. An offset may be given to start part way through the results; limit is managed by this method.
+
+        Yields:
+            dict: A single occurrence record.
+        """
+        search_params.pop("limit", None)
+        offset = search_params.pop("offset", None) or 0
+        split: Dict[str, Any] = {}
+
+        def fetch_page(limit, page_offset):
+            page = self.search_occurrences(limit=limit, offset=page_offset, **search_params)
+            if "subqueries" in page:
+                # Merged pages cannot be paged through; the sub-queries are paged one by one instead.
+                split["subqueries"] = page["subqueries"]
+                return {"results": [], "endOfRecords": True}
+            return page
+
+        yield from self._iterate_pages(fetch_page, page_size, max_records, offset)
+        if split:
+            yield from self._iterate_subqueries(
+                split["subqueries"],
+                page_size,
+                max_records,
+                offset,
+                search_params.get("fields"),
+            )
+
+    def _iterate_pages(self, fetch_page, page_size, max_records, offset):
+        fetched = 0
+        while offset < MAX_SEARCH_OFFSET:
+            limit = min(page_size, MAX_PAGE_SIZE, MAX_SEARCH_OFFSET - offset)
+            if max_records is not None:
+                limit = min(limit, max_records - fetched)
+            if limit <= 0:
+                return
+            page = fetch_page(limit, offset)
+            if "error" in page:
+                raise RuntimeError(
+                    f"Occurrence search failed at offset {offset}: {page['error']}"
+                )
+            records = page.get("results", [])
+            if max_records is not None:
+                records = records[: max_records - fetched]
+            yield from records
+            fetched += len(records)
+            offset += page.get("limit") or limit
+            if page.get("endOfRecords", True) or not page.get("results"):
+                return
+
+    def _iterate_subqueries(self, subqueries, page_size, max_records, skip, fields):
+        seen: set = set()
+        yielded = 0
+        for params in subqueries:
+            pages = self._iterate_pages(
+                lambda limit, offset, params=params: hc.get_with_params(
+                    base_url + self.endpoint,
+                    params={**params, "limit": limit, "offset": offset},
+                ),
+                page_size,
+                None,
+                0,
+            )
+            for record in pages:
+                if not _mark_seen(seen, record):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                yield record if fields is None else hc.select_fields(record, fields)
+                yielded += 1
+                if max_records is not None and yielded >= max_records:
+                    return
+
+    def _search_chunks(self, chunks, limit):
+        with ThreadPoolExecutor(
+            max_workers=min(len(chunks), DEFAULT_MAX_WORKERS)
+        ) as executor:
+            pages = list(
+                executor.map(
+                    lambda chunk: hc.get_with_params(
+                        base_url + self.endpoint, params=chunk
+                    ),
+                    chunks,
+                )
+            )
+        errors = [page for page in pages if "error" in page]
+        if errors:
+            return errors[0]
+        return _merge_pages(pages, chunks, limit)
 
     # Requires authentication. User must have an account with GBIF.
     def search_occurrences_using_predicates(
@@ -454,6 +588,7 @@ class OccurrenceSearch:
         facet_multiselect: Optional[bool] = None,
         facet_limit: Optional[int] = None,
         facet_offset: Optional[int] = None,
+        predicate: Optional[Any] = None,
     ):
         """
         Full search across all occurrences specified using predicates (as used for the download API).
@@ -468,12 +603,16 @@ class OccurrenceSearch:
             facet_multiselect (bool): Optional. Used in combination with the facet parameter. Set facetMultiselect=true to still return counts for values that are not currently filtered, e.g. /search?facet=basisOfRecord&limit=0&basisOfRecord=HUMAN_OBSERVATION&facetMultiselect=true still shows Basis of Record values 'PRESERVED_SPECIMEN' and so on, even though Basis of Record is being filtered.
             facet_limit (int): Optional. Facet parameters allow paging requests using the parameters facetOffset and facetLimit.
             facet_offset (int): Optional. Facet parameters allow paging requests using the parameters facetOffset and facetLimit.
+            predicate (Predicate or dict): Optional. The predicate to search with, built from library_of_life.occurrence.predicates (e.g. And(Equals("country", "DE"), In("taxon_key", [212, 359]))) or given directly as its JSON structure. Predicate objects are simplified before sending.
 
         Returns:
             dict: Dictionary containing the search results.
         """
+        if isinstance(predicate, Predicate):
+            predicate = predicate.to_dict()
         params: Dict[str, Any] = {}
         params_list = [
+            ("predicate", predicate),
             ("limit", limit),
             ("offset", offset),
             ("facet", facet),
@@ -495,6 +634,45 @@ class OccurrenceSearch:
                 base_url + self.endpoint + resource, headers=headers, json=params
             )
 
+    # Requires authentication. User must have an account with GBIF.
+    def iterate_occurrences_using_predicates(
+        self,
+        predicate,
+        username=None,
+        password=None,
+        page_size: int = MAX_PAGE_SIZE,
+        max_records: Optional[int] = None,
+        offset: Optional[int] = None,
+    ):
+        """
+        Pages through the results of a predicate search, yielding records one at a time, in the same way as iterate_occurrences does for the GET search. The predicate is serialized once and reused for every page.
+
+        Args:
+            predicate (Predicate or dict): Required. The predicate to search with.
+            username (str): Required for basic authentication. One's GBIF username.
+            password (str): Required for basic authentication. One's GBIF password.
+            page_size (int): Optional. Number of records requested per page. The service caps this at 300. Default is 300.
+            max_records (int): Optional. Stop after this many records.
+            offset (int): Optional. The offset to start from.
+
+        Yields:
+            dict: A single occurrence record.
+        """
+        if isinstance(predicate, Predicate):
+            predicate = predicate.to_dict()
+        return self._iterate_pages(
+            lambda limit, offset: self.search_occurrences_using_predicates(
+                username=username,
+                password=password,
+                limit=limit,
+                offset=offset,
+                predicate=predicate,
+            ),
+            page_size,
+            max_records,
+            offset or 0,
+        )
+
     def suggest_catalogue_numbers(self, query, limit):
         """
         Search that returns matching catalogue numbers. Results are ordered by relevance.
@@ -506,8 +684,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested catalogue numbers.
         """
-        resource = f"/catalogNumber?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/catalogNumber"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_collection_codes(self, query, limit):
         """
@@ -520,8 +700,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested collection codes.
         """
-        resource = f"/collectionCode?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/collectionCode"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_dataset_names(self, query, limit):
         """
@@ -534,8 +716,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested dataset names.
         """
-        resource = f"/datasetName?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/datasetName"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_event_ids(self, query, limit):
         """
@@ -548,8 +732,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested event ids.
         """
-        resource = f"/eventId?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/eventId"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_identified_by_values(self, query, limit):
         """
@@ -562,8 +748,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested identified by values.
         """
-        resource = f"/identifiedBy?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/identifiedBy"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_institution_codes(self, query, limit):
         """
@@ -576,8 +764,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested institution codes.
         """
-        resource = f"/institutionCode?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/institutionCode"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_localities(self, query, limit):
         """
@@ -590,8 +780,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested localities.
         """
-        resource = f"/locality?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/locality"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_occurrence_ids(self, query, limit):
         """
@@ -604,8 +796,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested occurrence ids.
         """
-        resource = f"/occurrenceId?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/occurrenceId"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_organism_ids(self, query, limit):
         """
@@ -618,8 +812,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested organism ids.
         """
-        resource = f"/organismId?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/organismId"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_other_catalogue_numbers(self, query, limit):
         """
@@ -632,8 +828,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested other catalogue numbers.
         """
-        resource = f"/otherCatalogNumbers?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/otherCatalogNumbers"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_parent_event_ids(self, query, limit):
         """
@@ -646,8 +844,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested parent event ids.
         """
-        resource = f"/parentEventId?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/parentEventId"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_record_numbers(self, query, limit):
         """
@@ -660,8 +860,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested record numbers.
         """
-        resource = f"/recordNumber?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/recordNumber"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_recorded_by_values(self, query, limit):
         """
@@ -674,8 +876,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested recorded by values.
         """
-        resource = f"/recordedBy?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/recordedBy"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_sampling_protocols(self, query, limit):
         """
@@ -688,8 +892,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested sampling protocols.
         """
-        resource = f"/samplingProtocol?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/samplingProtocol"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_state_provinces(self, query, limit):
         """
@@ -702,8 +908,10 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested state provinces.
         """
-        resource = f"/stateProvince?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/stateProvince"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
 
     def suggest_water_bodies(self, query, limit):
         """
@@ -716,8 +924,55 @@ class OccurrenceSearch:
         Returns:
             list: A list containing suggested water bodies.
         """
-        resource = f"/waterBody?q={query}&limit={limit}"
-        return hc.get(base_url + self.endpoint + resource)
+        resource = "/waterBody"
+        return hc.get_with_params(
+            base_url + self.endpoint + resource, params={"q": query, "limit": limit}
+        )
+
+
+def _mark_seen(seen, record):
+    key = record.get("key")
+    if key is None:
+        return True
+    if key in seen:
+        return False
+    seen.add(key)
+    return True
+
+
+def _merge_pages(pages, subqueries, limit):
+    seen: set = set()
+    results = []
+    facets: Dict[str, Dict[str, int]] = {}
+    for page in pages:
+        results.extend(r for r in page.get("results", []) if _mark_seen(seen, r))
+        for facet in page.get("facets", []):
+            counts = facets.setdefault(facet["field"], {})
+            for value in facet.get("counts", []):
+                counts[value["name"]] = counts.get(value["name"], 0) + value["count"]
+    return {
+        "offset": pages[0].get("offset"),
+        "limit": pages[0].get("limit"),
+        "endOfRecords": all(page.get("endOfRecords", True) for page in pages)
+        and (limit is None or len(results) <= limit),
+        "count": sum(page.get("count", 0) for page in pages),
+        "countIsUpperBound": True,
+        "results": results if limit is None else results[:limit],
+        "facets": [
+            {
+                "field": field,
+                "counts": [
+                    {"name": name, "count": count}
+                    for name, count in sorted(
+                        counts.items(), key=lambda item: item[1], reverse=True
+                    )
+                ],
+            }
+            for field, counts in facets.items()
+        ],
+        "facetsApproximate": True,
+        "subqueries": subqueries,
+    }
 
 
 ### NOT WORKING
@@ -0,0 +1,188 @@
+import os
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Dict
+
+from .download_formats import DownloadFormats
+from .schema import field_types, section_types, converter_for
+
+DEFAULT_CHUNK_BYTES = 32 << 20
+
+
+class SimpleCsvLoader:
+    """
+    Loads a SIMPLE_CSV occurrence download into typed, columnar batches.
+
+    SIMPLE_CSV files are tab-separated with a header row and no quoting. The file is cut into chunks of about chunk_bytes, always at line boundaries, and each chunk is parsed into a dictionary of column lists by a pool of worker processes. Column types come from DownloadFormats.describe_simple_csv_fields, fetched once per process, so no type guessing takes place.
+
+    An extracted .csv file is split by byte range and every worker reads its own chunks from disk. The .csv member of a zip file cannot be read at an offset, so it is decompressed sequentially and the chunks are handed to the workers.
+
+    Attributes:
+        path: The download, either the zip file or the extracted .csv file.
+        chunk_bytes: The approximate size of the chunk behind each batch.
+        processes: Number of worker processes. 0 parses in the calling process.
+        typed: Whether values are converted to the types of their fields.
+    """
+
+    def __init__(
+        self,
+        path,
+        chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+        processes: Optional[int] = None,
+        typed: bool = True,
+        formats: Optional[DownloadFormats] = None,
+    ):
+        self.path = path
+        self.chunk_bytes = chunk_bytes
+        self.processes = (os.cpu_count() or 1) if processes is None else processes
+        self.typed = typed
+        self.formats = formats
+        self._member = None
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members = [name for name in archive.namelist() if name.endswith(".csv")]
+            if not members:
+                raise ValueError(f"{path} contains no .csv file.")
+            self._member = members[0]
+        with self._open() as f:
+            self.header = f.readline().decode("utf-8").rstrip("\r\n").split("\t")
+            self._data_start = f.tell() if self._member is None else None
+
+    def schema(self) -> Dict[str, Optional[str]]:
+        """
+        Returns the type of every column of the file.
+
+        Returns:
+            dict: Column names mapped to type names, or None for columns the format description does not list.
+        """
+        types = section_types(field_types("simple_csv", self.formats), "")
+        return {name: types.get(name) for name in self.header}
+
+    def iter_batches(self, columns: Optional[List[str]] = None):
+        """
+        Streams the file as columnar batches, in file order.
+
+        Args:
+            columns (list): Optional. The columns to keep. Default is every column.
+
+        Yields:
+            dict: Column names mapped to equally long lists of values.
+        """
+        wanted = self.header if columns is None else list(columns)
+        missing = [name for name in wanted if name not in self.header]
+        if missing:
+            raise KeyError(f"The file has no columns {missing}.")
+        positions = [self.header.index(name) for name in wanted]
+        schema = self.schema() if self.typed else {}
+        types = [schema.get(name) for name in wanted]
+        spec = (wanted, positions, types)
+
+        if self._member is None:
+            tasks = (
+                (self.path, start, end, spec) for start, end in self._byte_ranges()
+            )
+            parse = _parse_range
+        else:
+            tasks = ((chunk, spec) for chunk in self._member_chunks())
+            parse = _parse_chunk_task
+
+        if self.processes <= 1:
+            for task in tasks:
+                yield parse(task)
+            return
+        with ProcessPoolExecutor(max_workers=self.processes) as executor:
+            pending = deque()
+            for task in tasks:
+                pending.append(executor.submit(parse, task))
+                if len(pending) >= 2 * self.processes:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def iter_rows(self, columns: Optional[List[str]] = None):
+        """
+        Streams the file one row at a time.
+
+        Args:
+            columns (list): Optional. The columns to keep. Default is every column.
+
+        Yields:
+            dict: A single row.
+        """
+        for batch in self.iter_batches(columns):
+            names = list(batch)
+            for values in zip(*batch.values()):
+                yield dict(zip(names, values))
+
+    @contextmanager
+    def _open(self):
+        if self._member is None:
+            with open(self.path, "rb") as f:
+                yield f
+        else:
+            with zipfile.ZipFile(self.path) as archive, archive.open(self._member) as f:
+                yield f
+
+    def _byte_ranges(self):
+        size = os.path.getsize(self.path)
+        start = self._data_start
+        with open(self.path, "rb") as f:
+            while start < size:
+                f.seek(min(start + self.chunk_bytes, size))
+                f.readline()
+                end = min(f.tell(), size)
+                yield start, end
+                start = end
+
+    def _member_chunks(self):
+        with self._open() as f:
+            f.readline()
+            remainder = b""
+            while True:
+                block = f.read(self.chunk_bytes)
+                if not block:
+                    break
+                block = remainder + block
+                cut = block.rfind(b"\n") + 1
+                if cut == 0:
+                    remainder = block
+                    continue
+                remainder = block[cut:]
+                yield block[:cut]
+            if remainder:
+                yield remainder
+
+
+def _parse_range(task):
+    path, start, end, spec = task
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return _parse_chunk(data, spec)
+
+
+def _parse_chunk_task(task):
+    return _parse_chunk(*task)
+
+
+def _parse_chunk(data, spec):
+    names, positions, types = spec
+    converters = [converter_for(field_type) for field_type in types]
+    columns = [[] for _ in names]
+    for line in data.decode("utf-8").split("\n"):
+        line = line.rstrip("\r")
+        if not line:
+            continue
+        row = line.split("\t")
+        width = len(row)
+        for column, position, converter in zip(columns, positions, converters):
+            value = row[position] if position < width else ""
+            if value == "":
+                column.append(None)
+            elif converter is None:
+                column.append(value)
+            else:
+                column.append(converter(value))
+    return dict(zip(names, columns))
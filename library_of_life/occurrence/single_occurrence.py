@@ -1,10 +1,13 @@
-from typing import Optional, Dict, Any
+from itertools import islice
+from typing import Optional, Dict, Any, Iterable
 
 from requests.exceptions import JSONDecodeError
 import requests_cache
 
 from ..gbif_root import GBIF
 from ..utils import http_client as hc
+from ..utils.concurrency import bounded_map
+from .search import MAX_PAGE_SIZE, DEFAULT_MAX_WORKERS
 
 base_url = GBIF().base_url
 
@@ -48,18 +51,134 @@ class SingleOccurrence:
                 cache_name, backend=backend, expire_after=expire_after
             )
 
-    def get_occurrence_by_id(self, gbif_id):
+    def get_occurrence_by_id(self, gbif_id, fields: Optional[list[str]] = None):
         """
         Returns details for a single, interpreted occurrence.
 
         Args:
             gbif_id (int): Integer gbifId for the occurrence. Example : 1258202889.
+            fields (list[str]): Optional. Occurrence fields to keep, e.g. ["key", "scientificName", "eventDate"]. All other fields are dropped as soon as the response is decoded.
 
         Returns:
             dict: A dictionary containing details for a single occurrence.
         """
         resource = f"/{gbif_id}"
-        return hc.try_get_except_json_decode_err(base_url, self.endpoint, resource)
+        response = hc.try_get_except_json_decode_err(base_url, self.endpoint, resource)
+        if fields is not None and "error" not in response and "Error" not in response:
+            return hc.select_fields(response, fields)
+        return response
+
+    def get_occurrences_by_ids(
+        self,
+        gbif_ids: Iterable,
+        fields: Optional[list[str]] = None,
+        use_search: bool = True,
+        batch_size: int = MAX_PAGE_SIZE,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        """
+        Fetches many interpreted occurrences by gbifId, e.g. to resolve the occurrences cited in a paper. IDs are de-duplicated and results are streamed as they arrive, with a status for every ID.
+
+        By default IDs are resolved in batches through the occurrence search, filtering on gbifId, which needs one request per batch instead of one per ID. IDs a batch does not return, e.g. because the search index lags behind, are then fetched one by one. With use_search set to False every ID is fetched individually. Requests run concurrently in both cases.
+
+        Args:
+            gbif_ids (iterable): The gbifIds to fetch. Duplicates are fetched once.
+            fields (list[str]): Optional. Occurrence fields to keep. All other fields are dropped as soon as the response is decoded.
+            use_search (bool): Optional. Resolve IDs in batches through the occurrence search. Default is True.
+            batch_size (int): Optional. Number of IDs per search request, at most 300. Default is 300.
+            max_workers (int): Optional. Number of requests issued at once. Default is 8.
+
+        Yields:
+            dict: One result per distinct ID, in completion order, with "gbif_id", "status" ("ok", "not_found" or "error") and either "occurrence" or "error".
+        """
+        ids = _unique_ids(gbif_ids)
+
+        def fetch_one(gbif_id):
+            response = hc.get(base_url + self.endpoint + f"/{gbif_id}")
+            if isinstance(response, dict) and "error" in response:
+                status = "not_found" if "404" in response["error"] else "error"
+                return {"gbif_id": gbif_id, "status": status, "error": response}
+            if fields is not None:
+                response = hc.select_fields(response, fields)
+            return {"gbif_id": gbif_id, "status": "ok", "occurrence": response}
+
+        if not use_search:
+            for _, result in bounded_map(fetch_one, ids, max_workers=max_workers):
+                yield result
+            return
+
+        batch_size = min(batch_size, MAX_PAGE_SIZE)
+
+        def fetch_batch(batch):
+            response = hc.get_with_params(
+                base_url + self.endpoint + "/search",
+                params={"gbifId": list(batch), "limit": len(batch)},
+            )
+            if "error" in response:
+                return {}, list(batch)
+            found = {}
+            for record in response.get("results", []):
+                gbif_id = str(record.get("key"))
+                found[gbif_id] = (
+                    hc.select_fields(record, fields) if fields is not None else record
+                )
+            return found, [gbif_id for gbif_id in batch if gbif_id not in found]
+
+        batches = iter(lambda: list(islice(ids, batch_size)), [])
+        for _, (found, missing) in bounded_map(
+            fetch_batch, batches, max_workers=max_workers
+        ):
+            for gbif_id, occurrence in found.items():
+                yield {"gbif_id": gbif_id, "status": "ok", "occurrence": occurrence}
+            for _, result in bounded_map(fetch_one, missing, max_workers=max_workers):
+                yield result
+
+    def compare_interpreted_and_verbatim(
+        self, gbif_ids: Iterable, max_workers: int = DEFAULT_MAX_WORKERS
+    ):
+        """
+        Fetches the interpreted and verbatim versions of many occurrences concurrently and reports which fields interpretation changed, e.g. for data quality checks. Only the differences are kept, so neither full record is held once its pair is compared.
+
+        Verbatim terms are matched to interpreted fields by the local name of their term URI, e.g. http://rs.tdwg.org/dwc/terms/countryCode is compared with countryCode. Values that are numerically equal, e.g. "12.50" and 12.5, are not reported. Verbatim terms without an interpreted counterpart are ignored.
+
+        Args:
+            gbif_ids (iterable): The gbifIds to compare. Duplicates are compared once.
+            max_workers (int): Optional. Number of requests issued at once. Default is 8.
+
+        Yields:
+            dict: One result per distinct ID, in completion order, with "gbif_id", "status" ("ok" or "error"), and either "changed", mapping each changed field to its verbatim and interpreted values, and "issues", the interpretation issues flagged on the record, or "error".
+        """
+        tasks = (
+            (gbif_id, resource)
+            for gbif_id in _unique_ids(gbif_ids)
+            for resource in ("", "/verbatim")
+        )
+        halves: Dict[str, Any] = {}
+        for (gbif_id, resource), response in bounded_map(
+            lambda task: hc.get(base_url + self.endpoint + f"/{task[0]}{task[1]}"),
+            tasks,
+            max_workers=max_workers,
+        ):
+            other = halves.pop(gbif_id, None)
+            if other is None:
+                halves[gbif_id] = (resource, response)
+                continue
+            pair = dict([other, (resource, response)])
+            interpreted, verbatim = pair[""], pair["/verbatim"]
+            failed = [
+                document
+                for document in (interpreted, verbatim)
+                if not isinstance(document, dict) or "error" in document
+            ]
+            if failed:
+                yield {"gbif_id": gbif_id, "status": "error", "error": failed[0]}
+                continue
+            yield {
+                "gbif_id": gbif_id,
+                "status": "ok",
+                "changed": _verbatim_diff(interpreted, verbatim),
+                "issues": interpreted.get("issues", []),
+            }
 
     def get_occurrence_by_dataset_key_and_occurrence_id(
         self, dataset_key, occurrence_id
@@ -160,3 +279,36 @@ class SingleOccurrence:
         """
         resource = "/term"
         return hc.try_get_except_json_decode_err(base_url, self.endpoint, resource)
+
+
+def _unique_ids(gbif_ids):
+    seen = set()
+    for gbif_id in gbif_ids:
+        gbif_id = str(gbif_id).strip()
+        if gbif_id and gbif_id not in seen:
+            seen.add(gbif_id)
+            yield gbif_id
+
+
+def _verbatim_diff(interpreted, verbatim):
+    changed = {}
+    for term, raw in verbatim.items():
+        if "/" not in term or isinstance(raw, (dict, list)):
+            continue
+        field = term.rstrip("/").rsplit("/", 1)[-1].rsplit("#", 1)[-1]
+        if field not in interpreted:
+            continue
+        value = interpreted[field]
+        if _same_value(raw, value):
+            continue
+        changed[field] = {"verbatim": raw, "interpreted": value}
+    return changed
+
+
+def _same_value(raw, value):
+    if raw == value or str(raw).strip() == str(value):
+        return True
+    try:
+        return float(raw) == float(value)
+    except (TypeError, ValueError):
+        return False
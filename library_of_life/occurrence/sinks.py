@@ -0,0 +1,299 @@
+import abc
+import csv
+import gzip
+import json
+from typing import Optional, Iterable, List, Dict, Any
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+class OccurrenceSink(abc.ABC):
+    """
+    Base class for writers that stream occurrence records to a file in row groups. Records are buffered until row_group_size of them have been collected and are then written out, so memory use depends on the row group size and not on the number of records.
+
+    Sinks can be fed directly from OccurrenceSearch.iterate_occurrences and should be closed (or used as a context manager) to flush the last row group.
+
+    Occurrence records are sparse: most of their fields are optional, so the first records seen do not show which fields later ones carry. Sinks with a fixed set of columns therefore require fields, and fields not listed are ignored.
+
+    Attributes:
+        path: The path of the output file.
+        row_group_size: The number of records buffered before each write.
+        fields: The fields written for each record, or None to write whole records where the format allows it.
+        records_written: The number of records written so far.
+    """
+
+    def __init__(
+        self,
+        path,
+        row_group_size: int = 10000,
+        fields: Optional[List[str]] = None,
+    ):
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be at least 1.")
+        self.path = path
+        self.row_group_size = row_group_size
+        self.fields = list(fields) if fields is not None else None
+        self.records_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._closed = False
+
+    def write(self, records: Iterable[Dict[str, Any]]):
+        """
+        Adds records to the sink, writing a row group every time the buffer is full.
+
+        Args:
+            records (iterable): Occurrence records, e.g. from OccurrenceSearch.iterate_occurrences.
+
+        Returns:
+            int: The total number of records written so far.
+        """
+        for record in records:
+            self._buffer.append(record)
+            if len(self._buffer) >= self.row_group_size:
+                self.flush()
+        return self.records_written
+
+    def flush(self):
+        """
+        Writes any buffered records as a row group.
+        """
+        if not self._buffer:
+            return
+        self._write_rows(self._buffer)
+        self.records_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """
+        Flushes the remaining records and closes the output file.
+        """
+        if self._closed:
+            return
+        self.flush()
+        self._close()
+        self._closed = True
+
+    @abc.abstractmethod
+    def _write_rows(self, rows):
+        """
+        Writes one row group to the output file.
+        """
+
+    @abc.abstractmethod
+    def _close(self):
+        """
+        Closes the output file.
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class NDJSONSink(OccurrenceSink):
+    """
+    Writes occurrence records as newline-delimited JSON, gzip-compressed by default. When no fields are given, whole records are written.
+
+    Attributes:
+        compression: Either "gzip" or None.
+    """
+
+    def __init__(
+        self,
+        path,
+        row_group_size: int = 10000,
+        fields: Optional[List[str]] = None,
+        compression: Optional[str] = "gzip",
+        compresslevel: int = 6,
+    ):
+        super().__init__(path, row_group_size=row_group_size, fields=fields)
+        self.compression = compression
+        self._file = _open_text(path, compression, compresslevel)
+
+    def _write_rows(self, rows):
+        if self.fields is not None:
+            rows = ({field: row.get(field) for field in self.fields} for row in rows)
+        self._file.writelines(
+            json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for row in rows
+        )
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class CSVSink(OccurrenceSink):
+    """
+    Writes occurrence records as delimited text with a header row, gzip-compressed by default. Nested values (lists and dictionaries) are written as JSON.
+
+    The columns are the fields given, in order; records missing a field get an empty value.
+
+    Attributes:
+        compression: Either "gzip" or None.
+        delimiter: The field delimiter.
+    """
+
+    def __init__(
+        self,
+        path,
+        row_group_size: int = 10000,
+        fields: Optional[List[str]] = None,
+        compression: Optional[str] = "gzip",
+        compresslevel: int = 6,
+        delimiter: str = ",",
+    ):
+        if fields is None:
+            raise ValueError("CSVSink requires fields, the columns to write.")
+        super().__init__(path, row_group_size=row_group_size, fields=fields)
+        self.compression = compression
+        self.delimiter = delimiter
+        self._file = _open_text(path, compression, compresslevel)
+        self._writer = None
+
+    def _write_rows(self, rows):
+        if self._writer is None:
+            self._writer = csv.DictWriter(
+                self._file,
+                fieldnames=self.fields,
+                delimiter=self.delimiter,
+                extrasaction="ignore",
+            )
+            self._writer.writeheader()
+        self._writer.writerows(
+            {field: _to_text(row.get(field)) for field in self.fields}
+            for row in rows
+        )
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetSink(OccurrenceSink):
+    """
+    Writes occurrence records to a Parquet file, one Parquet row group per buffered row group. Requires pyarrow.
+
+    The columns are given either as a schema or as fields, whose types are then inferred from the first row group: a column whose values are all booleans, all integers, or numbers is stored as such, and any other column, including nested values and fields absent from the first row group, is stored as text. A later value that does not fit its column without loss, such as 12.7 in an integer column, raises ValueError; pass schema to avoid that.
+
+    Attributes:
+        compression: The Parquet compression codec. Default is zstd.
+        schema: The pyarrow schema of the file. Inferred from the first row group when only fields are given.
+    """
+
+    def __init__(
+        self,
+        path,
+        row_group_size: int = 50000,
+        fields: Optional[List[str]] = None,
+        compression: str = "zstd",
+        schema=None,
+    ):
+        if pa is None:
+            raise ImportError(
+                "ParquetSink requires pyarrow. Install it with `pip install pyarrow`."
+            )
+        if schema is not None and fields is None:
+            fields = schema.names
+        if fields is None:
+            raise ValueError("ParquetSink requires fields or schema, the columns to write.")
+        super().__init__(path, row_group_size=row_group_size, fields=fields)
+        self.compression = compression
+        self.schema = schema
+        self._writer = None
+
+    def _write_rows(self, rows):
+        if self.schema is None:
+            self.schema = pa.schema(
+                [(field, _infer_arrow_type(rows, field)) for field in self.fields]
+            )
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(
+                self.path, self.schema, compression=self.compression
+            )
+        columns = [
+            pa.array(
+                [_to_arrow_value(row.get(field.name), field) for row in rows],
+                type=field.type,
+            )
+            for field in self.schema
+        ]
+        self._writer.write_table(
+            pa.Table.from_arrays(columns, schema=self.schema),
+            row_group_size=len(rows),
+        )
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _open_text(path, compression, compresslevel):
+    if compression == "gzip":
+        return gzip.open(
+            path, "wt", encoding="utf-8", newline="", compresslevel=compresslevel
+        )
+    if compression is None:
+        return open(path, "w", encoding="utf-8", newline="")
+    raise ValueError(f"Unsupported compression: {compression}. Use 'gzip' or None.")
+
+
+def _to_text(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def _infer_arrow_type(rows, field):
+    kinds = set()
+    for row in rows:
+        value = row.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add(bool)
+        elif isinstance(value, int):
+            kinds.add(int)
+        elif isinstance(value, float):
+            kinds.add(float)
+        else:
+            return pa.string()
+    if kinds == {bool}:
+        return pa.bool_()
+    if kinds == {int}:
+        return pa.int64()
+    if kinds and kinds <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def _to_arrow_value(value, field):
+    if value is None:
+        return None
+    arrow_type = field.type
+    if pa.types.is_string(arrow_type):
+        return value if isinstance(value, str) else str(_to_text(value))
+    if pa.types.is_boolean(arrow_type) and isinstance(value, bool):
+        return value
+    try:
+        if pa.types.is_integer(arrow_type) and not isinstance(value, bool):
+            converted = int(value)
+            if converted == value or (isinstance(value, str) and str(converted) == value.strip()):
+                return converted
+        elif pa.types.is_floating(arrow_type) and not isinstance(value, bool):
+            return float(value)
+        else:
+            return value
+    except (TypeError, ValueError, OverflowError):
+        pass
+    raise ValueError(
+        f"{value!r} cannot be stored in the {arrow_type} column {field.name} without loss. "
+        "Pass a schema with a wider type."
+    )
@@ -0,0 +1,229 @@
+import math
+from typing import Optional, Iterable, Dict, Any
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_SQRT3 = math.sqrt(3)
+# Hexagon axial coordinates are offset to be non-negative and packed into one int64 cell id.
+_HEX_OFFSET = 1 << 30
+
+
+class GridAggregator:
+    """
+    Bins streamed occurrence coordinates into a square or hexagonal grid, e.g. to build density or species richness maps from OccurrenceSearch.iterate_occurrences. Requires numpy.
+
+    Records are consumed in batches and binned with vectorized NumPy operations, so memory depends on the batch size and on the number of occupied cells, not on the number of records. When distinct_field is set (e.g. "speciesKey"), each cell also keeps the distinct values of that field as a sorted integer array, giving per-cell distinct counts such as species richness.
+
+    Grids are laid out in plain longitude/latitude degrees.
+
+    Attributes:
+        cell_size: The width of a square cell, or the circumradius of a hexagon, in degrees.
+        grid: Either "square" or "hex".
+        distinct_field: Optional. An integer field whose distinct values are counted per cell.
+        batch_size: Number of records binned at a time.
+    """
+
+    def __init__(
+        self,
+        cell_size: float = 1.0,
+        grid: str = "square",
+        distinct_field: Optional[str] = None,
+        batch_size: int = 50000,
+    ):
+        if np is None:
+            raise ImportError(
+                "GridAggregator requires numpy. Install it with `pip install numpy`."
+            )
+        if grid not in ("square", "hex"):
+            raise ValueError("grid must be 'square' or 'hex'.")
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive.")
+        self.cell_size = cell_size
+        self.grid = grid
+        self.distinct_field = distinct_field
+        self.batch_size = batch_size
+        self.records_binned = 0
+        self.records_skipped = 0
+        self._columns = math.ceil(360 / cell_size)
+        self._counts: Dict[int, int] = {}
+        self._distinct: Dict[int, Any] = {}
+
+    def consume(self, records: Iterable[Dict[str, Any]]):
+        """
+        Bins a stream of records. Records without coordinates, or without a distinct_field value when one is set, are skipped.
+
+        Args:
+            records (iterable): Occurrence records with decimalLatitude and decimalLongitude.
+
+        Returns:
+            GridAggregator: This aggregator, so calls can be chained.
+        """
+        lats, lons, values = [], [], []
+        for record in records:
+            lat = record.get("decimalLatitude")
+            lon = record.get("decimalLongitude")
+            value = record.get(self.distinct_field) if self.distinct_field else 0
+            if lat is None or lon is None or value is None:
+                self.records_skipped += 1
+                continue
+            lats.append(lat)
+            lons.append(lon)
+            values.append(value)
+            if len(lats) >= self.batch_size:
+                self.add_batch(lats, lons, values)
+                lats, lons, values = [], [], []
+        if lats:
+            self.add_batch(lats, lons, values)
+        return self
+
+    def add_batch(self, latitudes, longitudes, values=None):
+        """
+        Bins one batch of coordinates.
+
+        Args:
+            latitudes (array-like): Latitudes in decimal degrees.
+            longitudes (array-like): Longitudes in decimal degrees.
+            values (array-like): Optional. Integer values of distinct_field, aligned with the coordinates.
+        """
+        cells = self.cell_ids(latitudes, longitudes)
+        if cells.size == 0:
+            return
+        unique_cells, counts = np.unique(cells, return_counts=True)
+        for cell, count in zip(unique_cells.tolist(), counts.tolist()):
+            self._counts[cell] = self._counts.get(cell, 0) + count
+        self.records_binned += int(cells.size)
+
+        if self.distinct_field and values is not None:
+            pairs = np.unique(
+                np.stack([cells, np.asarray(values, dtype=np.int64)], axis=1), axis=0
+            )
+            boundaries = np.flatnonzero(np.diff(pairs[:, 0])) + 1
+            for group in np.split(pairs, boundaries):
+                cell = int(group[0, 0])
+                existing = self._distinct.get(cell)
+                group_values = group[:, 1]
+                self._distinct[cell] = (
+                    group_values.copy()
+                    if existing is None
+                    else np.union1d(existing, group_values)
+                )
+
+    def cell_ids(self, latitudes, longitudes):
+        """
+        Returns the grid cell of each coordinate.
+
+        Args:
+            latitudes (array-like): Latitudes in decimal degrees.
+            longitudes (array-like): Longitudes in decimal degrees.
+
+        Returns:
+            numpy.ndarray: One int64 cell id per coordinate.
+        """
+        lat = np.asarray(latitudes, dtype=np.float64)
+        lon = np.asarray(longitudes, dtype=np.float64)
+        if self.grid == "square":
+            return square_cell_id(lat, lon, self.cell_size)
+
+        # Pointy-top hexagons in axial coordinates, rounded through cube coordinates.
+        q = (_SQRT3 / 3 * lon - lat / 3) / self.cell_size
+        r = (2 / 3 * lat) / self.cell_size
+        x, z = q, r
+        y = -x - z
+        rx, ry, rz = np.round(x), np.round(y), np.round(z)
+        dx, dy, dz = np.abs(rx - x), np.abs(ry - y), np.abs(rz - z)
+        fix_x = (dx > dy) & (dx > dz)
+        fix_z = ~fix_x & (dy <= dz)
+        rx = np.where(fix_x, -ry - rz, rx)
+        rz = np.where(fix_z, -rx - ry, rz)
+        return ((rx.astype(np.int64) + _HEX_OFFSET) << 32) | (
+            rz.astype(np.int64) + _HEX_OFFSET
+        )
+
+    def cell_center(self, cell: int):
+        """
+        Returns the centre of a cell.
+
+        Args:
+            cell (int): A cell id.
+
+        Returns:
+            tuple: (latitude, longitude) of the centre.
+        """
+        if self.grid == "square":
+            row, column = divmod(cell, self._columns)
+            return (
+                -90 + (row + 0.5) * self.cell_size,
+                -180 + (column + 0.5) * self.cell_size,
+            )
+        q = (cell >> 32) - _HEX_OFFSET
+        r = (cell & 0xFFFFFFFF) - _HEX_OFFSET
+        return (
+            self.cell_size * 1.5 * r,
+            self.cell_size * _SQRT3 * (q + r / 2),
+        )
+
+    def counts(self) -> Dict[int, int]:
+        """
+        Returns the number of records in each occupied cell.
+
+        Returns:
+            dict: Cell ids mapped to record counts.
+        """
+        return dict(self._counts)
+
+    def distinct_counts(self) -> Dict[int, int]:
+        """
+        Returns the number of distinct distinct_field values in each occupied cell, e.g. species richness.
+
+        Returns:
+            dict: Cell ids mapped to distinct value counts.
+        """
+        return {cell: int(values.size) for cell, values in self._distinct.items()}
+
+    def to_records(self):
+        """
+        Yields one summary per occupied cell.
+
+        Yields:
+            dict: The cell id, the latitude and longitude of its centre, the record count and, when distinct_field is set, the distinct count.
+        """
+        for cell, count in self._counts.items():
+            latitude, longitude = self.cell_center(cell)
+            record = {
+                "cell": cell,
+                "latitude": latitude,
+                "longitude": longitude,
+                "count": count,
+            }
+            if self.distinct_field:
+                values = self._distinct.get(cell)
+                record["distinct"] = 0 if values is None else int(values.size)
+            yield record
+
+
+def square_cell_id(latitude, longitude, cell_size: float):
+    """
+    Returns the square grid cell holding a coordinate. Cells are cell_size degrees wide, numbered row by row from (-90, -180). Latitude 90 falls in the last row and longitude 180 in the last column, instead of past the edge of the grid.
+
+    Args:
+        latitude (float or numpy.ndarray): Latitude in decimal degrees.
+        longitude (float or numpy.ndarray): Longitude in decimal degrees.
+        cell_size (float): The width of a cell in degrees.
+
+    Returns:
+        int or numpy.ndarray: The cell id, or an int64 array of cell ids for arrays.
+    """
+    rows = math.ceil(180 / cell_size)
+    columns = math.ceil(360 / cell_size)
+    row = (latitude + 90) // cell_size
+    column = (longitude + 180) // cell_size
+    if np is not None and isinstance(row, np.ndarray):
+        row = np.clip(row, 0, rows - 1).astype(np.int64)
+        column = np.clip(column, 0, columns - 1).astype(np.int64)
+    else:
+        row = min(max(int(row), 0), rows - 1)
+        column = min(max(int(column), 0), columns - 1)
+    return row * columns + column
@@ -0,0 +1,284 @@
+import difflib
+import re
+from typing import Optional, Dict, Any, List
+
+from .download_formats import DownloadFormats
+from .downloads import OccurrenceDownload
+from .schema import field_types, section_types
+
+# The only table SQL downloads can query.
+TABLES = {"occurrence"}
+
+KEYWORDS = {
+    "SELECT", "DISTINCT", "ALL", "FROM", "WHERE", "AND", "OR", "NOT", "IN", "IS",
+    "NULL", "LIKE", "BETWEEN", "ESCAPE", "GROUP", "BY", "HAVING", "ORDER", "ASC",
+    "DESC", "NULLS", "FIRST", "LAST", "AS", "CASE", "WHEN", "THEN", "ELSE", "END",
+    "TRUE", "FALSE", "CAST", "LIMIT", "OFFSET", "ON",
+}
+
+# Type names that make a typed literal of the string after them, as in TIMESTAMP '2020-01-01'.
+TYPED_LITERALS = {"DATE", "TIME", "TIMESTAMP", "INTERVAL"}
+
+# Keywords of statements and clauses that SQL downloads do not accept.
+UNSUPPORTED_KEYWORDS = {
+    "JOIN": "Joins are not supported.",
+    "UNION": "Set operations are not supported.",
+    "INTERSECT": "Set operations are not supported.",
+    "EXCEPT": "Set operations are not supported.",
+    "WITH": "Common table expressions are not supported.",
+    "OVER": "Window functions are not supported.",
+    "INSERT": "Only SELECT queries are allowed.",
+    "UPDATE": "Only SELECT queries are allowed.",
+    "DELETE": "Only SELECT queries are allowed.",
+    "CREATE": "Only SELECT queries are allowed.",
+    "DROP": "Only SELECT queries are allowed.",
+}
+
+FUNCTIONS = {
+    # Aggregates and standard functions.
+    "COUNT", "SUM", "MIN", "MAX", "AVG", "ABS", "FLOOR", "CEIL", "CEILING", "ROUND",
+    "MOD", "POWER", "SQRT", "LOWER", "UPPER", "TRIM", "LENGTH", "CHAR_LENGTH",
+    "SUBSTRING", "CONCAT", "COALESCE", "NULLIF",
+    # GBIF functions.
+    "GBIF_DMSGRIDCODE", "GBIF_EEARGCODE", "GBIF_EQDGCODE", "GBIF_GEODISTANCE",
+    "GBIF_ISEA3HCODE", "GBIF_MGRSCODE", "GBIF_WITHIN", "GBIF_TEMPORALUNCERTAINTY",
+    "GBIF_TOISO8601", "GBIF_TOLOCALISO8601", "GBIF_MILLISECONDSTOISO8601",
+    "GBIF_SECONDSTOISO8601", "GBIF_SECONDSTOLOCALISO8601", "GBIF_STRINGARRAYCONTAINS",
+    "GBIF_STRINGARRAYLIKE",
+}
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<symbol><>|<=|>=|!=|\|\||[(),.;*=<>+\-/%])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class SqlValidator:
+    """
+    Checks SQL download queries locally, before they are sent to GBIF.
+
+    Queries are tokenized and checked against the rules of SQL downloads: a single SELECT on the occurrence table, without joins, subqueries, set operations or window functions. Every column must be listed by DownloadFormats.describe_sql_fields, which is fetched once per process, and every function must be a standard or GBIF function. Most mistakes are caught without a request; confirm sends queries that pass to OccurrenceDownload.validate_sql for a final check.
+
+    Attributes:
+        functions: Upper-case names of the accepted functions.
+    """
+
+    def __init__(
+        self,
+        formats: Optional[DownloadFormats] = None,
+        extra_functions: Optional[List[str]] = None,
+    ):
+        self.formats = formats
+        self.functions = FUNCTIONS | {name.upper() for name in extra_functions or []}
+        self._fields = None
+
+    def fields(self) -> Dict[str, str]:
+        """
+        Returns the columns SQL downloads can query.
+
+        Returns:
+            dict: Lower-case column names mapped to column names as described.
+        """
+        if self._fields is None:
+            types = section_types(field_types("sql", self.formats), "")
+            self._fields = {
+                name.casefold(): name for name in types if "/" not in name and ":" not in name
+            }
+        return self._fields
+
+    def validate(self, sql: str) -> Dict[str, Any]:
+        """
+        Validates a query without contacting GBIF.
+
+        Args:
+            sql (str): The query.
+
+        Returns:
+            dict: "valid", the list of "errors", and the "columns" and "functions" the query uses.
+        """
+        errors: List[str] = []
+        tokens = _tokenize(sql, errors)
+        while tokens and tokens[-1] == ("symbol", ";"):
+            tokens.pop()
+        if not tokens:
+            errors.append("The query is empty.")
+            return _result(errors, [], [])
+        if ("symbol", ";") in tokens:
+            errors.append("Only a single statement is allowed.")
+        if tokens[0][0] != "name" or tokens[0][1].upper() != "SELECT":
+            errors.append("Only SELECT queries are allowed.")
+
+        depth = 0
+        for kind, text in tokens:
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth < 0:
+                    break
+        if depth != 0:
+            errors.append("Unbalanced parentheses.")
+
+        words = [text.upper() for kind, text in tokens if kind == "name"]
+        for word, message in UNSUPPORTED_KEYWORDS.items():
+            if word in words and message not in errors:
+                errors.append(message)
+        if words.count("SELECT") > 1:
+            errors.append("Subqueries are not supported.")
+        if words.count("FROM") != 1:
+            errors.append("The query must select FROM the occurrence table exactly once.")
+
+        tables, skip = _from_clause(tokens, errors)
+        columns, functions, aliases = [], [], set()
+        previous = None
+        for i, (kind, text) in enumerate(tokens):
+            following = tokens[i + 1] if i + 1 < len(tokens) else (None, None)
+            upper = text.upper()
+            if i in skip or (kind == "name" and upper in UNSUPPORTED_KEYWORDS):
+                pass
+            elif kind == "name" and upper in KEYWORDS:
+                if upper == "AS" and following[0] in ("name", "quoted"):
+                    aliases.add(_unquote(following[1]).casefold())
+                    skip.add(i + 1)
+            elif kind == "name" and upper in TYPED_LITERALS and following[0] == "string":
+                pass
+            elif kind == "name" and following[1] == "(":
+                functions.append(text)
+                if upper not in self.functions:
+                    errors.append(f"Unknown function {text}.{_suggestion(upper, self.functions)}")
+            elif kind in ("name", "quoted") and following[1] == ".":
+                if _unquote(text).casefold() not in tables:
+                    errors.append(f"Unknown table {text}. Only the occurrence table can be queried.")
+            elif kind in ("name", "quoted") and _ends_value(previous):
+                aliases.add(_unquote(text).casefold())
+            elif kind in ("name", "quoted"):
+                columns.append(_unquote(text))
+            previous = (kind, text)
+
+        columns = [column for column in columns if column.casefold() not in aliases]
+        if columns:
+            fields = self.fields()
+            for column in dict.fromkeys(columns):
+                if column.casefold() not in fields:
+                    errors.append(f"Unknown column {column}.{_suggestion(column.casefold(), fields)}")
+        return _result(errors, columns, functions)
+
+    def confirm(
+        self,
+        sql: str,
+        username,
+        password,
+        download: Optional[OccurrenceDownload] = None,
+        **request_body,
+    ) -> Dict[str, Any]:
+        """
+        Validates a query locally and, when it passes, with OccurrenceDownload.validate_sql.
+
+        Args:
+            sql (str): The query.
+            username (str): The username.
+            password (str): The user's password.
+            download (OccurrenceDownload): Optional. The client used for the request.
+            **request_body: Other fields of the download request, e.g. format. Default format is SQL_TSV_ZIP.
+
+        Returns:
+            dict: The result of validate, with the "server" response when the query was sent.
+        """
+        result = self.validate(sql)
+        if not result["valid"]:
+            return result
+        download = download or OccurrenceDownload()
+        body = {"format": "SQL_TSV_ZIP", **request_body, "sql": sql}
+        response = download.validate_sql(username, password, body)
+        result["server"] = response
+        if isinstance(response, str) and response.startswith("Invalid"):
+            result["errors"].append(response)
+        elif isinstance(response, dict) and "error" in response:
+            result["errors"].append(str(response["error"]))
+        result["valid"] = not result["errors"]
+        return result
+
+
+def _tokenize(sql, errors):
+    tokens = []
+    position = 0
+    while position < len(sql):
+        match = _TOKEN.match(sql, position)
+        if match is None:
+            errors.append(f"Unexpected character {sql[position]!r} at position {position}.")
+            position += 1
+            continue
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group()))
+        position = match.end()
+    return tokens
+
+
+def _from_clause(tokens, errors):
+    # Returns the names the occurrence table goes by, and the positions of the FROM clause tokens.
+    tables, skip = set(TABLES), set()
+    for i, (kind, text) in enumerate(tokens):
+        if kind != "name" or text.upper() != "FROM":
+            continue
+        skip.add(i)
+        table_kind, table = tokens[i + 1] if i + 1 < len(tokens) else (None, "")
+        if table == "(":
+            continue
+        skip.add(i + 1)
+        if table_kind not in ("name", "quoted") or _unquote(table).casefold() not in TABLES:
+            errors.append(f"Unknown table {table}. Only the occurrence table can be queried.")
+            continue
+        after = i + 2
+        if after < len(tokens) and tokens[after][0] == "name" and tokens[after][1].upper() == "AS":
+            skip.add(after)
+            after += 1
+        if after < len(tokens):
+            kind, alias = tokens[after]
+            if alias == ",":
+                errors.append("Only the occurrence table can be queried.")
+            elif kind in ("name", "quoted") and alias.upper() not in KEYWORDS | set(UNSUPPORTED_KEYWORDS):
+                tables.add(_unquote(alias).casefold())
+                skip.add(after)
+    return tables, skip
+
+
+def _unquote(text):
+    if text.startswith('"'):
+        return text[1:-1].replace('""', '"')
+    return text
+
+
+def _ends_value(token):
+    # An identifier directly after a value is an alias, as in SELECT COUNT(*) n.
+    if token is None:
+        return False
+    kind, text = token
+    if kind == "name":
+        return text.upper() not in KEYWORDS
+    return kind in ("quoted", "number", "string") or text == ")"
+
+
+def _suggestion(name, candidates):
+    matches = difflib.get_close_matches(name, list(candidates), n=1)
+    if not matches:
+        return ""
+    match = matches[0]
+    if isinstance(candidates, dict):
+        match = candidates[match]
+    return f" Did you mean {match}?"
+
+
+def _result(errors, columns, functions):
+    return {
+        "valid": not errors,
+        "errors": errors,
+        "columns": list(dict.fromkeys(columns)),
+        "functions": list(dict.fromkeys(functions)),
+    }
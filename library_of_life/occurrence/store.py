@@ -0,0 +1,327 @@
+import json
+import math
+import os
+import sqlite3
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from typing import Optional, List, Dict, Any
+
+from .columnar import ParquetDownloadReader, AvroDownloadReader
+from .download_formats import DownloadFormats
+from .dwca import DwcaReader
+from .simple_csv import SimpleCsvLoader
+from .spatial import square_cell_id
+
+# Fields indexed in every store, matched ignoring case and underscores.
+INDEXED_FIELDS = ("taxonKey", "datasetKey", "eventDate", "countryCode")
+GRID_COLUMN = "grid_key"
+DEFAULT_GRID_SIZE = 1.0
+TABLE = "occurrences"
+
+
+class OccurrenceStore:
+    """
+    A local SQLite database of occurrence records, filled from retrieved downloads so they can be queried repeatedly without reading the files again.
+
+    Downloads in DWCA, SIMPLE_CSV, SIMPLE_PARQUET or SIMPLE_AVRO format are read with DwcaReader, SimpleCsvLoader, ParquetDownloadReader and AvroDownloadReader. Reading and parsing run in a background thread, and SIMPLE_CSV files are also parsed by a pool of processes, while the calling thread inserts the previous batch with executemany, one transaction per batch.
+
+    The occurrences table gets a column for every column ingested, added as new columns appear, and records are keyed by gbifID when the download has it, so ingesting a download twice does not duplicate records. Each record also gets a grid_key: the square cell of grid_size degrees holding its coordinates, numbered by square_cell_id as in GridAggregator, so spatial queries can use an index. The columns of INDEXED_FIELDS and grid_key are indexed once ingestion is complete.
+
+    Attributes:
+        path: Path of the SQLite database.
+        grid_size: The width of the grid cells in degrees. Fixed when the store is created, 1 degree unless given.
+        batch_size: Number of records per insert, for formats read by record.
+    """
+
+    def __init__(
+        self,
+        path="occurrences.sqlite",
+        grid_size: Optional[float] = None,
+        batch_size: int = 10000,
+        formats: Optional[DownloadFormats] = None,
+    ):
+        if grid_size is not None and grid_size <= 0:
+            raise ValueError("grid_size must be positive.")
+        self.path = path
+        self.batch_size = batch_size
+        self.formats = formats
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingested (
+                    path TEXT NOT NULL,
+                    download_format TEXT NOT NULL,
+                    records INTEGER NOT NULL,
+                    ingested_at TEXT NOT NULL
+                )
+                """
+            )
+            row = self._db.execute(
+                "SELECT value FROM store_meta WHERE key = 'grid_size'"
+            ).fetchone()
+            if row is None:
+                grid_size = grid_size or DEFAULT_GRID_SIZE
+                self._db.execute(
+                    "INSERT INTO store_meta VALUES ('grid_size', ?)", (repr(float(grid_size)),)
+                )
+            elif grid_size is None:
+                grid_size = float(row["value"])
+            elif float(row["value"]) != float(grid_size):
+                raise ValueError(
+                    f"{path} was created with grid_size {row['value']}, not {grid_size}."
+                )
+        self.grid_size = float(grid_size)
+
+    def columns(self) -> List[str]:
+        """
+        Returns the columns of the occurrences table.
+
+        Returns:
+            list: The column names, empty before the first ingest.
+        """
+        return [row["name"] for row in self._db.execute(f"PRAGMA table_info({TABLE})")]
+
+    def grid_key(self, latitude, longitude) -> Optional[int]:
+        """
+        Returns the grid cell holding a coordinate, to query records by their grid_key column.
+
+        Args:
+            latitude (float): Latitude in decimal degrees.
+            longitude (float): Longitude in decimal degrees.
+
+        Returns:
+            int: The cell, or None when a coordinate is missing or not a number.
+        """
+        try:
+            latitude, longitude = float(latitude), float(longitude)
+        except (TypeError, ValueError):
+            return None
+        if math.isnan(latitude) or math.isnan(longitude):
+            return None
+        return square_cell_id(latitude, longitude, self.grid_size)
+
+    def ingest(
+        self,
+        path,
+        download_format: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        processes: Optional[int] = None,
+    ) -> int:
+        """
+        Loads a retrieved download into the store.
+
+        Args:
+            path (str): The download: a zip file as retrieved, or an extracted .csv, .avro or Parquet file or directory.
+            download_format (str): Optional. DWCA, SIMPLE_CSV, SIMPLE_PARQUET or SIMPLE_AVRO. Detected from the file when not given.
+            columns (list): Optional. The columns to load. Default is every column. Columns needed for the key, the grid and the indexes are always loaded when the download has them.
+            processes (int): Optional. Number of processes parsing SIMPLE_CSV files. Default is the number of CPUs.
+
+        Returns:
+            int: The number of records ingested.
+        """
+        download_format = (download_format or _detect_format(path)).upper()
+        batches = self._batches(path, download_format, columns, processes)
+        records = 0
+        try:
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                pending = executor.submit(next, batches, None)
+                while True:
+                    batch = pending.result()
+                    if batch is None:
+                        break
+                    pending = executor.submit(next, batches, None)
+                    records += self._insert(*batch)
+        finally:
+            batches.close()
+        self._create_indexes()
+        with self._db:
+            self._db.execute(
+                "INSERT INTO ingested VALUES (?, ?, ?, ?)",
+                (
+                    os.fspath(path),
+                    download_format,
+                    records,
+                    datetime.now(timezone.utc).isoformat(),
+                ),
+            )
+        return records
+
+    def query(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        """
+        Runs a query on the store.
+
+        Args:
+            sql (str): The query, e.g. "SELECT countryCode, COUNT(*) FROM occurrences WHERE taxonKey = ? GROUP BY countryCode".
+            params (tuple or dict): Optional. The query parameters.
+
+        Returns:
+            list: The result rows as dictionaries.
+        """
+        return [dict(row) for row in self._db.execute(sql, params)]
+
+    def close(self):
+        """
+        Closes the database.
+        """
+        self._db.close()
+
+    def _batches(self, path, download_format, columns, processes):
+        # Yields (column names, rows) pairs, with the grid key appended to every row.
+        if download_format == "DWCA":
+            reader = DwcaReader(path, batch_size=self.batch_size, formats=self.formats)
+            try:
+                names = self._wanted(reader.columns(), columns)
+                for batch in reader.iter_batches(columns=names):
+                    yield self._rows(names, [[row[name] for name in names] for row in batch])
+            finally:
+                reader.close()
+        elif download_format == "SIMPLE_CSV":
+            loader = SimpleCsvLoader(path, processes=processes, formats=self.formats)
+            names = self._wanted(loader.header, columns)
+            for batch in loader.iter_batches(names):
+                yield self._rows(names, zip(*batch.values()))
+        elif download_format == "SIMPLE_PARQUET":
+            reader = ParquetDownloadReader(path)
+            names = self._wanted(reader.schema.names, columns)
+            for batch in reader.iter_batches(names, batch_size=self.batch_size):
+                yield self._rows(names, zip(*batch.to_pydict().values()))
+        elif download_format == "SIMPLE_AVRO":
+            reader = AvroDownloadReader(path)
+            names = self._wanted(reader.field_names(), columns)
+            for batch in reader.iter_batches(names):
+                yield self._rows(names, [[record[name] for name in names] for record in batch])
+        else:
+            raise ValueError(f"Downloads in {download_format} format cannot be ingested.")
+
+    def _wanted(self, available, columns):
+        if columns is None:
+            return list(available)
+        required = ("gbifID", "decimalLatitude", "decimalLongitude") + INDEXED_FIELDS
+        wanted = [_match(available, name) for name in columns]
+        missing = [name for name, found in zip(columns, wanted) if found is None]
+        if missing:
+            raise KeyError(f"The download has no columns {missing}.")
+        for name in required:
+            found = _match(available, name)
+            if found is not None and found not in wanted:
+                wanted.append(found)
+        return wanted
+
+    def _rows(self, names, rows):
+        latitude = _position(names, "decimalLatitude")
+        longitude = _position(names, "decimalLongitude")
+        out = []
+        for row in rows:
+            values = [_sql_value(value) for value in row]
+            if latitude is None or longitude is None:
+                values.append(None)
+            else:
+                values.append(self.grid_key(values[latitude], values[longitude]))
+            out.append(values)
+        return names + [GRID_COLUMN], out
+
+    def _insert(self, names, rows):
+        if not rows:
+            return 0
+        targets = self._ensure_columns(names)
+        statement = "INSERT OR REPLACE INTO %s (%s) VALUES (%s)" % (
+            TABLE,
+            ", ".join(_quote(name) for name in targets),
+            ", ".join("?" * len(targets)),
+        )
+        with self._db:
+            self._db.executemany(statement, rows)
+        return len(rows)
+
+    def _ensure_columns(self, names):
+        # Creates the table or adds missing columns, and returns the table column of each name.
+        existing = {_key(name): name for name in self.columns()}
+        if not existing:
+            definitions = []
+            for name in names:
+                if name == GRID_COLUMN:
+                    definitions.append(f"{GRID_COLUMN} INTEGER")
+                elif _key(name) == "gbifid":
+                    definitions.append(f"{_quote(name)} INTEGER PRIMARY KEY")
+                else:
+                    definitions.append(_quote(name))
+            with self._db:
+                self._db.execute(f"CREATE TABLE {TABLE} ({', '.join(definitions)})")
+            return list(names)
+        targets = []
+        for name in names:
+            if _key(name) not in existing:
+                with self._db:
+                    self._db.execute(f"ALTER TABLE {TABLE} ADD COLUMN {_quote(name)}")
+                existing[_key(name)] = name
+            targets.append(existing[_key(name)])
+        return targets
+
+    def _create_indexes(self):
+        columns = self.columns()
+        with self._db:
+            for field in INDEXED_FIELDS + (GRID_COLUMN,):
+                column = _match(columns, field)
+                if column is not None:
+                    self._db.execute(
+                        f"CREATE INDEX IF NOT EXISTS {TABLE}_{_key(field)} "
+                        f"ON {TABLE} ({_quote(column)})"
+                    )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _detect_format(path):
+    if os.path.isdir(path) or str(path).endswith(".parquet"):
+        return "SIMPLE_PARQUET"
+    if str(path).endswith(".avro"):
+        return "SIMPLE_AVRO"
+    if not zipfile.is_zipfile(path):
+        return "SIMPLE_CSV"
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+    if "meta.xml" in names:
+        return "DWCA"
+    if any(name.endswith(".csv") for name in names):
+        return "SIMPLE_CSV"
+    if any(name.endswith(".avro") for name in names):
+        return "SIMPLE_AVRO"
+    return "SIMPLE_PARQUET"
+
+
+def _key(name):
+    return name.replace("_", "").casefold()
+
+
+def _match(names, name):
+    key = _key(name)
+    return next((candidate for candidate in names if _key(candidate) == key), None)
+
+
+def _position(names, name):
+    found = _match(names, name)
+    return None if found is None else names.index(found)
+
+
+def _quote(name):
+    return '"%s"' % name.replace('"', '""')
+
+
+def _sql_value(value):
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
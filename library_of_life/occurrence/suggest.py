@@ -0,0 +1,195 @@
+import threading
+from typing import Optional, Callable, Dict, Any
+
+from .search import OccurrenceSearch
+
+
+class SuggestionCache:
+    """
+    A local typeahead cache for the OccurrenceSearch suggest_* methods, backed by one prefix trie per suggestion kind.
+
+    Every answered query is stored at its node in the trie. When the server returned fewer suggestions than the limit asked for, the list is complete: every value the server would suggest for a longer query starting with the same text is already in it, since a value containing the longer text also contains the shorter one. Longer queries are then answered from memory by filtering that list, without a round trip.
+
+    By default the cached list is filtered by case-insensitive substring, so infix matches the server returned, such as "West Berlin" for "Be", are kept for "Ber". This holds whether the server matches prefixes, words or substrings, though with a prefix-matching server it can keep a few values the server would not suggest. Pass prefix_match as match for kinds known to match on prefixes only.
+
+    Attributes:
+        search: The OccurrenceSearch client used for requests.
+        max_entries: The number of cached queries kept before the cache is cleared.
+        match: A function (suggestion, query) -> bool used to filter complete lists. Default is substring_match.
+    """
+
+    def __init__(
+        self,
+        search: Optional[OccurrenceSearch] = None,
+        max_entries: int = 10000,
+        match: Optional[Callable[[str, str], bool]] = None,
+    ):
+        self.search = search or OccurrenceSearch()
+        self.max_entries = max_entries
+        self.match = match or substring_match
+        self.hits = 0
+        self.misses = 0
+        self._tries: Dict[str, Dict[str, Any]] = {}
+        self._entries = 0
+        self._lock = threading.Lock()
+
+    def suggest(self, kind: str, query: str, limit: int = 10):
+        """
+        Returns suggestions for a query, from memory when possible.
+
+        Args:
+            kind (str): The suggestion kind, named after the OccurrenceSearch method, e.g. "localities" or "suggest_localities".
+            query (str): The text typed so far.
+            limit (int): Optional. The maximum number of suggestions. Default is 10.
+
+        Returns:
+            list: The suggestions, or the error dictionary returned by the request.
+        """
+        kind = _method_name(kind)
+        method = getattr(self.search, kind)
+        with self._lock:
+            cached = self._lookup(kind, query, limit)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        results = method(query, limit)
+        if isinstance(results, list):
+            with self._lock:
+                self._store(kind, query, limit, results)
+        return results
+
+    def clear(self):
+        """
+        Empties the cache.
+        """
+        with self._lock:
+            self._tries.clear()
+            self._entries = 0
+
+    def _lookup(self, kind, query, limit):
+        node = self._tries.get(kind)
+        if node is None:
+            return None
+        key = query.casefold()
+        complete = None
+        for position in range(len(key) + 1):
+            entry = node.get("entry")
+            if entry is not None:
+                results, entry_limit = entry
+                if position == len(key) and entry_limit >= limit:
+                    return results[:limit]
+                if len(results) < entry_limit:
+                    complete = results
+            if position == len(key):
+                break
+            node = node.get("children", {}).get(key[position])
+            if node is None:
+                break
+        if complete is None:
+            return None
+        return [value for value in complete if self.match(str(value), query)][:limit]
+
+    def _store(self, kind, query, limit, results):
+        if self._entries >= self.max_entries:
+            self._tries.clear()
+            self._entries = 0
+        node = self._tries.setdefault(kind, {})
+        for char in query.casefold():
+            node = node.setdefault("children", {}).setdefault(char, {})
+        if "entry" not in node:
+            self._entries += 1
+        node["entry"] = (list(results), limit)
+
+
+class Debouncer:
+    """
+    Delays calls to a function until input has been quiet for a while, and drops results of calls that have since been superseded.
+
+    Intended for typeahead: call submit on every keystroke. Only the last call made within the wait period reaches the server, and its result is passed to the callback unless a newer call was submitted or cancel was called in the meantime.
+
+    Attributes:
+        func: The function to call, e.g. SuggestionCache.suggest.
+        callback: Called with the result of each call that is still current.
+        wait: The quiet period in seconds.
+    """
+
+    def __init__(self, func: Callable, callback: Callable, wait: float = 0.25):
+        self.func = func
+        self.callback = callback
+        self.wait = wait
+        self._generation = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def submit(self, *args, **kwargs):
+        """
+        Schedules a call, replacing any call still waiting.
+
+        Args:
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(
+                self.wait, self._run, args=(generation, args, kwargs)
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """
+        Cancels the waiting call and discards the result of any call in progress.
+        """
+        with self._lock:
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _run(self, generation, args, kwargs):
+        with self._lock:
+            if generation != self._generation:
+                return
+        result = self.func(*args, **kwargs)
+        with self._lock:
+            if generation != self._generation:
+                return
+        self.callback(result)
+
+
+def _method_name(kind):
+    return kind if kind.startswith("suggest_") else f"suggest_{kind}"
+
+
+def substring_match(value: str, query: str) -> bool:
+    """
+    Tells whether a suggestion contains a query, ignoring case. The default match of SuggestionCache.
+
+    Args:
+        value (str): The suggestion.
+        query (str): The text typed.
+
+    Returns:
+        bool: Whether the suggestion contains the query.
+    """
+    return query.casefold() in value.casefold()
+
+
+def prefix_match(value: str, query: str) -> bool:
+    """
+    Tells whether a suggestion starts with a query, ignoring case. For suggest kinds known to match on prefixes only.
+
+    Args:
+        value (str): The suggestion.
+        query (str): The text typed.
+
+    Returns:
+        bool: Whether the suggestion starts with the query.
+    """
+    return value.casefold().startswith(query.casefold())
@@ -0,0 +1,181 @@
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from .search import OccurrenceSearch, MAX_PAGE_SIZE, MAX_SEARCH_OFFSET
+from ..utils import http_client as hc
+
+# Where open-ended date ranges are split when they hold too many records to page through.
+EARLIEST_DATE = "1970-01-01"
+
+
+class OccurrenceSync:
+    """
+    Incrementally harvests occurrence searches by keeping a high-water mark per query.
+
+    Each run only asks for records whose last_interpreted (or modified) date falls between the previous run's watermark and the start of the current run. The search service does not page beyond an offset of 100,000, so the range is first counted and, while a range holds more records than that, split in two by date until every sub-range can be paged through. Sub-ranges are harvested oldest first and the watermark advances as each one completes. The remaining sub-ranges and the paging position are checkpointed to a JSON state file after every page, so a run that dies part way through resumes from the last completed page. Because the date range is inclusive and measured in whole days, records on the boundary day can be delivered twice; consumers should upsert by occurrence key.
+
+    Attributes:
+        state_path: Path of the JSON file holding watermarks and checkpoints.
+        date_field: The search parameter the watermark applies to, either "last_interpreted" or "modified".
+        page_size: Number of records requested per page.
+    """
+
+    def __init__(
+        self,
+        state_path="occurrence_sync_state.json",
+        date_field="last_interpreted",
+        page_size: int = MAX_PAGE_SIZE,
+        search: Optional[OccurrenceSearch] = None,
+    ):
+        if date_field not in ("last_interpreted", "modified"):
+            raise ValueError("date_field must be 'last_interpreted' or 'modified'.")
+        self.state_path = state_path
+        self.date_field = date_field
+        self.page_size = page_size
+        self.search = search or OccurrenceSearch()
+        self._state = self._load_state()
+
+    def sync(self, since: Optional[str] = None, **search_params):
+        """
+        Yields the occurrences matching a search that changed since the last completed run. The watermark is advanced as each date sub-range is consumed completely.
+
+        Raises RuntimeError before yielding from a single day that holds more records than the search can page through.
+
+        Args:
+            since (str): Optional. ISO 8601 date to start from when the query has never been synced. Without it the first run fetches every matching record.
+            **search_params: Optional. Any keyword argument accepted by search_occurrences, except limit, offset and the date field used for the watermark.
+
+        Yields:
+            dict: A single occurrence record.
+        """
+        for param in ("limit", "offset", self.date_field):
+            if param in search_params:
+                raise ValueError(f"{param} is managed by OccurrenceSync.")
+        key = self.query_key(**search_params)
+        entry = self._state.setdefault(key, {})
+        pending = entry.get("pending")
+        if pending is None:
+            pending = {
+                "ranges": [[entry.get("watermark", since), datetime.now(timezone.utc).date().isoformat()]],
+                "offset": 0,
+            }
+            entry["pending"] = pending
+            self._save_state()
+
+        while pending["ranges"]:
+            lower, upper = pending["ranges"][0]
+            params = dict(search_params)
+            params[self.date_field] = f"{lower or '*'},{upper}"
+            if pending["offset"] == 0:
+                count = self._count(params)
+                if count > MAX_SEARCH_OFFSET:
+                    pending["ranges"][0:1] = _split_range(lower, upper, count)
+                    self._save_state()
+                    continue
+            while True:
+                if pending["offset"] >= MAX_SEARCH_OFFSET:
+                    raise RuntimeError(
+                        f"More than {MAX_SEARCH_OFFSET} records changed between {lower or 'the start'} and {upper} while syncing. Run the sync again."
+                    )
+                page = self.search.search_occurrences(
+                    limit=min(self.page_size, MAX_SEARCH_OFFSET - pending["offset"]),
+                    offset=pending["offset"],
+                    **params,
+                )
+                if "error" in page:
+                    raise RuntimeError(
+                        f"Occurrence search failed at offset {pending['offset']}: {page['error']}"
+                    )
+                records = page.get("results", [])
+                yield from records
+                pending["offset"] += len(records)
+                self._save_state()
+                if page.get("endOfRecords", True) or not records:
+                    break
+            pending["ranges"].pop(0)
+            pending["offset"] = 0
+            entry["watermark"] = upper
+            self._save_state()
+
+        del entry["pending"]
+        self._save_state()
+
+    def _count(self, params):
+        page = self.search.search_occurrences(limit=0, **params)
+        if "error" in page:
+            raise RuntimeError(f"Occurrence count failed: {page['error']}")
+        return page.get("count", 0)
+
+    def get_watermark(self, **search_params):
+        """
+        Returns the watermark of the last completed run for a search.
+
+        Args:
+            **search_params: The same keyword arguments passed to sync.
+
+        Returns:
+            str: An ISO 8601 date, or None if the search has never completed a sync.
+        """
+        return self._state.get(self.query_key(**search_params), {}).get("watermark")
+
+    def reset(self, **search_params):
+        """
+        Forgets the watermark and any checkpoint for a search, so the next run starts from scratch.
+
+        Args:
+            **search_params: The same keyword arguments passed to sync.
+        """
+        self._state.pop(self.query_key(**search_params), None)
+        self._save_state()
+
+    def query_key(self, **search_params):
+        """
+        Returns the key under which the state for a search is stored.
+
+        Args:
+            **search_params: The same keyword arguments passed to sync.
+
+        Returns:
+            str: A hash of the search parameters and the watermark field.
+        """
+        return hc.query_hash({"date_field": self.date_field, **search_params})
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_state(self):
+        # Write to a temporary file first so a crash never leaves a truncated state file.
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._state, f, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _split_range(lower, upper, count):
+    # Halves a date range; an open lower bound stays open in the first half.
+    first = date.fromisoformat(lower or EARLIEST_DATE)
+    last = date.fromisoformat(upper)
+    if lower is None and last <= first:
+        first = last - timedelta(days=365 * 50)
+    if last <= first:
+        raise RuntimeError(
+            f"{count} records changed on {upper}, more than the {MAX_SEARCH_OFFSET} the search can page through. Narrow the query."
+        )
+    middle = first + (last - first) // 2
+    return [
+        [lower, middle.isoformat()],
+        [(middle + timedelta(days=1)).isoformat(), upper],
+    ]
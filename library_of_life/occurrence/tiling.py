@@ -0,0 +1,233 @@
+import re
+import warnings
+from typing import Optional, List, Dict, Any
+
+from .search import (
+    OccurrenceSearch,
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_OFFSET,
+    DEFAULT_MAX_WORKERS,
+)
+from ..utils import http_client as hc
+from ..utils.concurrency import bounded_map
+
+_NUMBER = r"[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?"
+
+
+class GeometryTiler:
+    """
+    Splits large spatial occurrence searches into a grid of smaller cells and runs them in parallel.
+
+    The bounding box of the search area is divided into a grid. Cells are counted first and any cell holding more than max_cell_records is split into quadrants until it fits, so that every cell can be paged completely within the search offset limit. A WKT geometry is still sent with every cell query, with the cell itself expressed as decimalLatitude and decimalLongitude ranges, so results are exactly those of the original geometry search.
+
+    Attributes:
+        search: The OccurrenceSearch client used for requests.
+        max_cell_records: The largest number of records a cell may hold before it is split.
+        initial_grid: The number of rows and columns of the starting grid.
+        min_cell_size: The smallest cell edge, in degrees. Cells at this size are not split further.
+        max_workers: Number of requests issued at once.
+    """
+
+    def __init__(
+        self,
+        search: Optional[OccurrenceSearch] = None,
+        max_cell_records: int = MAX_SEARCH_OFFSET,
+        initial_grid: int = 4,
+        min_cell_size: float = 0.01,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+    ):
+        if not 0 < max_cell_records <= MAX_SEARCH_OFFSET:
+            raise ValueError(
+                f"max_cell_records must be between 1 and {MAX_SEARCH_OFFSET}."
+            )
+        self.search = search or OccurrenceSearch()
+        self.max_cell_records = max_cell_records
+        self.initial_grid = initial_grid
+        self.min_cell_size = min_cell_size
+        self.max_workers = max_workers
+
+    def plan(
+        self,
+        geometry: Optional[str] = None,
+        bbox: Optional[tuple] = None,
+        **search_params,
+    ) -> List[Dict[str, Any]]:
+        """
+        Builds the grid of cells for a search, adapting cell sizes to the number of records in each.
+
+        Args:
+            geometry (str): Optional. A WKT POLYGON or MULTIPOLYGON to search within.
+            bbox (tuple): Optional. (min_longitude, min_latitude, max_longitude, max_latitude). Defaults to the bounding box of geometry.
+            **search_params: Optional. Any other keyword argument accepted by search_occurrences.
+
+        Returns:
+            list: Dictionaries with the bounds of each non-empty cell and its record count.
+        """
+        if bbox is None:
+            if geometry is None:
+                raise ValueError("Either geometry or bbox must be provided.")
+            bbox = wkt_bounds(geometry)
+        min_lon, min_lat, max_lon, max_lat = bbox
+        step_lon = (max_lon - min_lon) / self.initial_grid
+        step_lat = (max_lat - min_lat) / self.initial_grid
+        level = [
+            _cell(
+                min_lon + i * step_lon,
+                min_lat + j * step_lat,
+                max_lon if i == self.initial_grid - 1 else min_lon + (i + 1) * step_lon,
+                max_lat if j == self.initial_grid - 1 else min_lat + (j + 1) * step_lat,
+                bbox,
+            )
+            for i in range(self.initial_grid)
+            for j in range(self.initial_grid)
+        ]
+
+        cells = []
+        while level:
+            next_level = []
+            counted = bounded_map(
+                lambda cell: self._count(cell, geometry, search_params),
+                level,
+                max_workers=self.max_workers,
+            )
+            for cell, count in counted:
+                if count == 0:
+                    continue
+                cell["count"] = count
+                too_small = (
+                    cell["max_lon"] - cell["min_lon"] <= self.min_cell_size
+                    and cell["max_lat"] - cell["min_lat"] <= self.min_cell_size
+                )
+                if count <= self.max_cell_records or too_small:
+                    if count > MAX_SEARCH_OFFSET:
+                        warnings.warn(
+                            f"A cell holds {count} records but only the first "
+                            f"{MAX_SEARCH_OFFSET} can be paged; consider a download instead."
+                        )
+                    cells.append(cell)
+                else:
+                    next_level.extend(_quadrants(cell, bbox))
+            level = next_level
+        return cells
+
+    def search_occurrences(
+        self,
+        geometry: Optional[str] = None,
+        bbox: Optional[tuple] = None,
+        page_size: int = MAX_PAGE_SIZE,
+        **search_params,
+    ):
+        """
+        Runs a spatial occurrence search cell by cell, fetching pages of all cells in parallel. Each record is yielded once, from the cell that contains its coordinates.
+
+        Args:
+            geometry (str): Optional. A WKT POLYGON or MULTIPOLYGON to search within.
+            bbox (tuple): Optional. (min_longitude, min_latitude, max_longitude, max_latitude). Defaults to the bounding box of geometry.
+            page_size (int): Optional. Number of records requested per page. Default is 300.
+            **search_params: Optional. Any other keyword argument accepted by search_occurrences, e.g. taxon_key or fields.
+
+        Yields:
+            dict: A single occurrence record.
+        """
+        cells = self.plan(geometry=geometry, bbox=bbox, **search_params)
+        fields = search_params.get("fields")
+        if fields is not None:
+            # Coordinates are needed to decide which cell a record belongs to.
+            search_params["fields"] = list(fields) + [
+                field
+                for field in ("decimalLatitude", "decimalLongitude")
+                if field not in fields
+            ]
+        pages = (
+            (cell, offset)
+            for cell in cells
+            for offset in range(0, min(cell["count"], MAX_SEARCH_OFFSET), page_size)
+        )
+
+        def fetch(task):
+            cell, offset = task
+            page = self.search.search_occurrences(
+                limit=min(page_size, MAX_SEARCH_OFFSET - offset),
+                offset=offset,
+                **_cell_params(cell, geometry, search_params),
+            )
+            if "error" in page:
+                raise RuntimeError(f"Occurrence search failed: {page['error']}")
+            return page.get("results", [])
+
+        for (cell, _), records in bounded_map(fetch, pages, max_workers=self.max_workers):
+            for record in records:
+                if _owns(cell, record):
+                    yield record if fields is None else hc.select_fields(record, fields)
+
+    def _count(self, cell, geometry, search_params):
+        params = _cell_params(cell, geometry, search_params)
+        params.pop("fields", None)
+        page = self.search.search_occurrences(limit=0, **params)
+        if "error" in page:
+            raise RuntimeError(f"Occurrence count failed: {page['error']}")
+        return page.get("count", 0)
+
+
+def wkt_bounds(geometry):
+    """
+    Returns the bounding box of a WKT POLYGON or MULTIPOLYGON.
+
+    Args:
+        geometry (str): The WKT geometry.
+
+    Returns:
+        tuple: (min_longitude, min_latitude, max_longitude, max_latitude).
+    """
+    coordinates = re.findall(rf"({_NUMBER})\s+({_NUMBER})", geometry)
+    if not coordinates:
+        raise ValueError("No coordinates found in the WKT geometry.")
+    lons = [float(lon) for lon, _ in coordinates]
+    lats = [float(lat) for _, lat in coordinates]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def _cell(min_lon, min_lat, max_lon, max_lat, bbox):
+    # Cells own their lower edges; only cells on the outer boundary also own the upper edge.
+    return {
+        "min_lon": min_lon,
+        "min_lat": min_lat,
+        "max_lon": max_lon,
+        "max_lat": max_lat,
+        "closed_lon": max_lon >= bbox[2],
+        "closed_lat": max_lat >= bbox[3],
+    }
+
+
+def _quadrants(cell, bbox):
+    mid_lon = (cell["min_lon"] + cell["max_lon"]) / 2
+    mid_lat = (cell["min_lat"] + cell["max_lat"]) / 2
+    return [
+        _cell(cell["min_lon"], cell["min_lat"], mid_lon, mid_lat, bbox),
+        _cell(mid_lon, cell["min_lat"], cell["max_lon"], mid_lat, bbox),
+        _cell(cell["min_lon"], mid_lat, mid_lon, cell["max_lat"], bbox),
+        _cell(mid_lon, mid_lat, cell["max_lon"], cell["max_lat"], bbox),
+    ]
+
+
+def _cell_params(cell, geometry, search_params):
+    params = dict(search_params)
+    if geometry is not None:
+        params["geometry"] = geometry
+    params["decimal_latitude"] = f"{cell['min_lat']},{cell['max_lat']}"
+    params["decimal_longitude"] = f"{cell['min_lon']},{cell['max_lon']}"
+    return params
+
+
+def _owns(cell, record):
+    lat = record.get("decimalLatitude")
+    lon = record.get("decimalLongitude")
+    if lat is None or lon is None:
+        return True
+    in_lat = cell["min_lat"] <= lat and (
+        lat < cell["max_lat"] or (cell["closed_lat"] and lat == cell["max_lat"])
+    )
+    in_lon = cell["min_lon"] <= lon and (
+        lon < cell["max_lon"] or (cell["closed_lon"] and lon == cell["max_lon"])
+    )
+    return in_lat and in_lon
@@ -220,6 +220,7 @@ class Datasets:
         ]
 
         hc.add_params(params, params_list)
+        params = hc.canonicalize_params(params)
         resource = "/search"
         return hc.get_with_params(base_url + self.endpoint + resource, params=params)
 
@@ -182,6 +182,7 @@ class NameSearch:
             ("facetOffset", facet_offset),
         ]
         hc.add_params(params, params_list)
+        params = hc.canonicalize_params(params)
         resource = "/search"
         return hc.get_with_params(base_url + self.endpoint + resource, params=params)
 
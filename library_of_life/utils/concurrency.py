@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+
+def bounded_map(func, items, max_workers=8, max_pending=None):
+    """
+    Applies a function to items on a thread pool and yields the results as they complete. Items are consumed lazily and at most max_pending calls are in flight, so memory stays bounded even for very long inputs.
+
+    Args:
+        func (callable): The function to apply to each item.
+        items (iterable): The items to process.
+        max_workers (int): Optional. Number of worker threads. Default is 8.
+        max_pending (int): Optional. Maximum number of submitted but unconsumed calls. Default is twice max_workers.
+
+    Yields:
+        tuple: (item, result) pairs in completion order. An exception raised by func is re-raised here.
+    """
+    max_pending = max_pending or 2 * max_workers
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(func, item): item for item in islice(items, max_pending)}
+        try:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    yield item, future.result()
+                for item in islice(items, max_pending - len(pending)):
+                    pending[executor.submit(func, item)] = item
+        finally:
+            for future in pending:
+                future.cancel()
@@ -1,11 +1,23 @@
+import hashlib
+import json
+import os
+import re
+
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import HTTPError, Timeout, RequestException, JSONDecodeError
 from requests.auth import HTTPBasicAuth
-from typing import Dict
+from requests_cache.patcher import OriginalSession
+from typing import Dict, List
+from urllib.parse import urlencode
 from time import sleep
 from functools import wraps
 
 
+# Conservative bound on the length of a GET URL accepted by the API servers.
+MAX_URL_LENGTH = 6000
+
+
 def retry(retries=3, delay=1, backoff=2):
     """
     Retry decorator with exponential backoff.
@@ -202,6 +214,178 @@ def get_for_content_with_params(url, params, headers=None):
         return {"error": f"An unexpected error occurred: {err}"}
 
 
+# Default size of the blocks in which streamed downloads are written to disk.
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+
+def _uncached_session():
+    # Large archives must not be copied into the response cache. A plain session bypasses it
+    # without swapping the global requests.Session, which would race with other threads.
+    return OriginalSession()
+
+
+@retry()
+def download_to_file(url, path, chunk_size=DOWNLOAD_CHUNK_SIZE, resume=True, headers=None):
+    """
+    Streams the body of a response to a file in chunks, without holding it in memory.
+
+    The body is written to path + ".part" and renamed to path once complete, so path never holds a partial file. When resume is set and a partial file is left over from an earlier attempt, only the missing bytes are requested with an HTTP Range header. When the server answers that no bytes are left, the partial file is kept only if its size matches the total in the Content-Range of that answer; otherwise the download restarts from the beginning. Dropped connections and timeouts are retried by the retry decorator, each attempt resuming where the previous one stopped.
+
+    Args:
+        url (str): The URL of the file.
+        path (str): Where to write the file.
+        chunk_size (int): Optional. Number of bytes read and written at a time. Default is 1 MiB.
+        resume (bool): Optional. Continue a partial file left by an earlier attempt. Default is True.
+        headers (dict): Optional. Headers to be included in the request.
+
+    Returns:
+        str: The path of the file, or a dictionary with error information.
+    """
+    part_path = path + ".part"
+    start = os.path.getsize(part_path) if resume and os.path.exists(part_path) else 0
+    request_headers = dict(headers or {})
+    if start:
+        request_headers["Range"] = f"bytes={start}-"
+    try:
+        with _uncached_session() as session, session.get(
+            url, headers=request_headers, stream=True, timeout=60
+        ) as response:
+            complete = start and response.status_code == 416
+            if not complete:
+                response.raise_for_status()
+                mode = "ab" if start and response.status_code == 206 else "wb"
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+        if complete and _unsatisfied_range_total(response) != start:
+            # The partial file is stale or larger than the body.
+            os.remove(part_path)
+            return download_to_file(url, path, chunk_size=chunk_size, resume=False, headers=headers)
+        os.replace(part_path, path)
+        return path
+    except HTTPError as http_err:
+        return handle_error(response, f"HTTP error occurred: {http_err}")
+    # Timeouts and connection errors propagate to the retry decorator, which resumes the download.
+
+
+def download_ranges_to_file(
+    url,
+    path,
+    size,
+    connections=4,
+    segment_size=64 * DOWNLOAD_CHUNK_SIZE,
+    retries=3,
+    expected_hash=None,
+    hash_name="md5",
+    chunk_size=DOWNLOAD_CHUNK_SIZE,
+):
+    """
+    Downloads a large file over several connections at once, each fetching byte ranges with HTTP Range requests into a preallocated file.
+
+    The file is split into segments of segment_size bytes, downloaded by up to connections threads. A segment that fails is retried on its own, continuing from the last byte it wrote. The Content-Range of every response must match the requested bytes and give size as the total size, so a file whose size differs from the expected one is rejected. When expected_hash is given, the hash of the complete file is checked as well. The file is written to path + ".ranges.part", apart from the partial files download_to_file resumes, and renamed to path once complete. It is removed when the download fails, since its missing segments are zero-filled holes.
+
+    When the server ignores Range requests and answers with the whole body, the file is downloaded over a single connection with download_to_file instead.
+
+    Args:
+        url (str): The URL of the file. The server must support Range requests.
+        path (str): Where to write the file.
+        size (int): The size of the file in bytes.
+        connections (int): Optional. Number of segments downloaded at once. Default is 4.
+        segment_size (int): Optional. Number of bytes per segment. Default is 64 MiB.
+        retries (int): Optional. Attempts per segment before giving up. Default is 3.
+        expected_hash (str): Optional. The hexadecimal digest the file must have.
+        hash_name (str): Optional. The hashlib algorithm of expected_hash. Default is md5.
+        chunk_size (int): Optional. Number of bytes read and written at a time. Default is 1 MiB.
+
+    Returns:
+        str: The path of the file, or a dictionary with error information.
+    """
+    part_path = path + ".ranges.part"
+    with open(part_path, "wb") as f:
+        f.truncate(size)
+
+    def fetch_segment(segment):
+        start, end = segment
+        position, attempts, current_delay = start, 0, 1
+        with _uncached_session() as session:
+            while True:
+                try:
+                    with session.get(
+                        url,
+                        headers={"Range": f"bytes={position}-{end}"},
+                        stream=True,
+                        timeout=60,
+                    ) as response:
+                        response.raise_for_status()
+                        if response.status_code != 206:
+                            raise _RangesNotSupported()
+                        _check_content_range(response, position, end, size)
+                        with open(part_path, "r+b") as f:
+                            f.seek(position)
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                f.write(chunk)
+                                position += len(chunk)
+                    if position > end:
+                        return
+                    raise RequestException(f"Segment ended early at byte {position}.")
+                except (Timeout, RequestException) as e:
+                    attempts += 1
+                    if attempts >= retries:
+                        raise
+                    print(f"Error: {e}. Retrying segment {start}-{end} in {current_delay} seconds...")
+                    sleep(current_delay)
+                    current_delay *= 2
+
+    segments = [
+        (start, min(start + segment_size, size) - 1)
+        for start in range(0, size, segment_size)
+    ]
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            list(executor.map(fetch_segment, segments))
+    except _RangesNotSupported:
+        os.remove(part_path)
+        return download_to_file(url, path, chunk_size=chunk_size, resume=False)
+    except Exception as err:
+        os.remove(part_path)
+        return {"error": f"Ranged download failed: {err}"}
+
+    if expected_hash is not None:
+        digest = hashlib.new(hash_name)
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                digest.update(block)
+        if digest.hexdigest().lower() != expected_hash.lower():
+            os.remove(part_path)
+            return {"error": f"The {hash_name} hash of the download does not match."}
+    os.replace(part_path, path)
+    return path
+
+
+def _unsatisfied_range_total(response):
+    # The size of the file from the Content-Range of a 416 answer, "bytes */size".
+    match = re.fullmatch(r"bytes \*/(\d+)", response.headers.get("Content-Range", "").strip())
+    return int(match.group(1)) if match else None
+
+
+class _RangesNotSupported(Exception):
+    # Raised when a server answers a Range request with the whole body.
+    pass
+
+
+def _check_content_range(response, start, end, size):
+    match = re.fullmatch(
+        r"bytes (\d+)-(\d+)/(\d+|\*)", response.headers.get("Content-Range", "").strip()
+    )
+    if match is None:
+        raise ValueError("The server sent a partial response without a valid Content-Range.")
+    first, last, total = match.groups()
+    if (int(first), int(last)) != (start, end):
+        raise ValueError(f"Requested bytes {start}-{end} but received {first}-{last}.")
+    if total != "*" and int(total) != size:
+        raise ValueError(f"The file holds {total} bytes, expected {size}.")
+
+
 @retry()
 def post_with_data(url, data):
     """
@@ -286,6 +470,9 @@ def post_with_auth_and_json(url, headers=None, auth=None, json=None):
             }
         else:
             return handle_error(response, f"HTTP error occurred: {http_err}")
+    except JSONDecodeError:
+        # Some endpoints, e.g. download requests, answer with a plain-text key.
+        return response.text
     except Timeout:
         return {"error": "Request timed out."}
     except RequestException as req_err:
@@ -445,3 +632,131 @@ def add_params(params, params_list):
     for original_param_name, new_param_name in params_list:
         if new_param_name is not None:
             params[original_param_name] = new_param_name
+
+
+def select_fields(record, fields):
+    """
+    Projects a record onto the given fields, dropping every other key. Fields missing from the record are left out.
+
+    Args:
+        record (dict): The record to project, e.g. a single occurrence.
+        fields (list): The names of the fields to keep.
+
+    Returns:
+        dict: A new dictionary containing only the requested fields.
+    """
+    return {field: record[field] for field in fields if field in record}
+
+
+def canonicalize_params(params):
+    """
+    Rewrites query parameters into one canonical form, so that semantically identical queries produce identical requests and cache keys.
+
+    Parameters are ordered by name and None values are dropped. Multi-value parameters are de-duplicated and sorted, since the API ORs their values, and a single value is sent as a scalar. Tuples of two values are rendered as the API's "lower,upper" range syntax, with None as the "*" wildcard. Booleans are rendered as "true" and "false". Nested dictionaries are canonicalized recursively, and lists of dictionaries keep their order.
+
+    Args:
+        params (dict): The query parameters.
+
+    Returns:
+        dict: A new dictionary of canonical parameters.
+    """
+    canonical = {}
+    for name in sorted(params):
+        value = _canonical_value(params[name])
+        if value is not None:
+            canonical[name] = value
+    return canonical
+
+
+def _canonical_value(value):
+    if isinstance(value, dict):
+        return canonicalize_params(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, tuple) and len(value) == 2:
+        return ",".join("*" if bound is None else str(_canonical_value(bound)) for bound in value)
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        # Lists of structured items are ordered, e.g. partitions of a harvest.
+        return [_canonical_value(item) for item in value]
+    if isinstance(value, (list, tuple, set, frozenset)):
+        values = {}
+        for item in value:
+            item = _canonical_value(item)
+            if item is not None:
+                values[json.dumps(item, sort_keys=True, default=str)] = item
+        items = sorted(values.values(), key=_sort_key)
+        if not items:
+            return None
+        return items[0] if len(items) == 1 else items
+    return value
+
+
+def _sort_key(value):
+    if isinstance(value, (int, float)):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+def query_hash(params):
+    """
+    Returns a stable hash of a set of query parameters, computed over their canonical form so that it does not depend on parameter order, value order or formatting.
+
+    Args:
+        params (dict): The query parameters.
+
+    Returns:
+        str: A hexadecimal SHA-256 digest.
+    """
+    encoded = json.dumps(
+        canonicalize_params(params), sort_keys=True, default=str, separators=(",", ":")
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def split_params(url, params, max_url_length=MAX_URL_LENGTH) -> List[dict]:
+    """
+    Splits a query whose URL would be too long into several queries that each fit, by dividing the values of its largest multi-value parameter into chunks. Values within a parameter are OR'ed by the API, so the union of the sub-queries matches the original query.
+
+    Args:
+        url (str): The URL of the API endpoint.
+        params (dict): The parameters of the query. List values are sent as repeated parameters.
+        max_url_length (int): Optional. The longest URL allowed for a single query.
+
+    Returns:
+        list: A list of parameter dictionaries. It contains only params when no split is needed.
+    """
+    full_length = len(requests.Request("GET", url, params=params).prepare().url)
+    if full_length <= max_url_length:
+        return [params]
+
+    multi_valued = [
+        name
+        for name, value in params.items()
+        if isinstance(value, (list, set)) and len(value) > 1
+    ]
+    if not multi_valued:
+        raise ValueError(
+            f"The query URL is {full_length} characters long and cannot be split."
+        )
+    name = max(multi_valued, key=lambda n: len(urlencode({n: params[n]}, doseq=True)))
+    values = list(params[name])
+    rest = {key: value for key, value in params.items() if key != name}
+    budget = max_url_length - len(requests.Request("GET", url, params=rest).prepare().url)
+
+    chunks, chunk, used = [], [], 0
+    for value in values:
+        size = len(urlencode({name: value})) + 1
+        if chunk and used + size > budget:
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(value)
+        used += size
+    chunks.append(chunk)
+    if len(chunks) == 1:
+        # The largest parameter fits on its own; another one must be split too.
+        chunks = [values[: len(values) // 2], values[len(values) // 2 :]]
+
+    split = []
+    for chunk in chunks:
+        split.extend(split_params(url, {**rest, name: chunk}, max_url_length))
+    return split